@@ -2,7 +2,10 @@ import argparse
 from types import ModuleType
 from typing import Dict
 
+from icu_tokenizer.bin import merge as merge_module
 from icu_tokenizer.bin import normalize as normalize_module
+from icu_tokenizer.bin import parallel_corpus as parallel_corpus_module
+from icu_tokenizer.bin import serve as serve_module
 from icu_tokenizer.bin import split as split_module
 from icu_tokenizer.bin import tokenize as tokenize_module
 
@@ -10,6 +13,9 @@ SUBCOMMANDS: Dict[str, ModuleType] = {
     'normalize': normalize_module,
     'split': split_module,
     'tokenize': tokenize_module,
+    'parallel-corpus': parallel_corpus_module,
+    'merge': merge_module,
+    'serve': serve_module,
 }
 
 
@@ -0,0 +1,344 @@
+"""Vectorized normalization of many lines at once.
+
+A batch of lines is joined and encoded into a single UCS-4 NumPy buffer.
+Every code point is then classified and mapped with lookup tables covering
+all of Unicode, which are computed once per process from the patterns and
+replace maps of a :class:`~icu_tokenizer.normalizer.Normalizer`. Results
+are identical to :meth:`Normalizer.normalize
+<icu_tokenizer.normalizer.Normalizer.normalize>`.
+
+NFKC only runs on the lines containing a character it could change, most
+lines of a typical corpus have none. The pseudo-space substitution is
+skipped, it looks for no-break spaces which NFKC has already replaced.
+Lines that the tables cannot handle (lines containing inner newlines,
+digits without a decimal value, replacements longer than a character) are
+normalized one by one.
+
+Requires NumPy.
+
+Usage:
+
+>>> batch_normalizer = BatchNormalizer(Normalizer('en', norm_puncts=True))
+>>> norm_texts: List[str] = batch_normalizer.normalize_batch(texts)
+"""
+
+import sys
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
+import regex
+
+from icu_tokenizer.normalizer import Normalizer
+
+__all__ = ['BatchNormalizer']
+
+NUM_CODE_POINTS = sys.maxunicode + 1
+
+# Code point flags
+SPACE = 1
+DIGIT = 2
+DELETE = 4
+FALLBACK = 8
+
+# Digit values of code points that are not digits and of digits without a
+# decimal value
+NOT_A_DIGIT = -1
+NO_DECIMAL = -2
+
+# Hangul vowel and trailing consonant jamo, which compose with the
+# preceding character
+HANGUL_JAMO_RANGES = [(0x1161, 0x1176), (0x11A8, 0x11C3)]
+
+# Unicode tables already computed by this process, by pattern
+_UNICODE_TABLES: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+_STABLE_TABLES: List[np.ndarray] = []
+
+
+def _get_all_code_points() -> str:
+    code_points = np.arange(NUM_CODE_POINTS, dtype='<u4')
+    return code_points.tobytes().decode('utf-32-le', 'surrogatepass')
+
+
+def _match_all(pattern: regex.Pattern, text: str) -> np.ndarray:
+    """Mark the characters of text matched by a single character pattern."""
+    runs_pattern = regex.compile(
+        '(?:{})+'.format(pattern.pattern), pattern.flags)
+    matched = np.zeros(len(text), dtype=bool)
+    for match in runs_pattern.finditer(text):
+        matched[match.start():match.end()] = True
+    return matched
+
+
+def get_unicode_tables(
+    ignore_pattern: regex.Pattern,
+    num_pattern: regex.Pattern,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Classify every code point with the patterns of a normalizer.
+
+    Args:
+        ignore_pattern (regex.Pattern): Characters replaced by spaces.
+        num_pattern (regex.Pattern): Runs of digits.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Whether each code point becomes a
+        space and the digit value of each code point.
+    """
+    key = (ignore_pattern.pattern, num_pattern.pattern)
+    if key in _UNICODE_TABLES:
+        return _UNICODE_TABLES[key]
+
+    all_chars = _get_all_code_points()
+
+    is_space = _match_all(ignore_pattern, all_chars)
+    is_space |= np.array([c.isspace() for c in all_chars], dtype=bool)
+
+    digit_values = np.full(NUM_CODE_POINTS, NOT_A_DIGIT, dtype=np.int8)
+    for i in np.flatnonzero(_match_all(num_pattern, all_chars)):
+        digit_values[i] = unicodedata.decimal(chr(i), NO_DECIMAL)
+
+    _UNICODE_TABLES[key] = is_space, digit_values
+    return is_space, digit_values
+
+
+def get_nfkc_stable_table() -> np.ndarray:
+    """Find the code points NFKC leaves unchanged whatever surrounds them.
+
+    Stable code points are their own NFKC, are not combining marks and
+    neither they nor the start of their decomposition compose with a
+    preceding character. NFKC leaves text made of stable code points only
+    unchanged.
+
+    Returns:
+        np.ndarray: Whether each code point is stable.
+    """
+    if len(_STABLE_TABLES) > 0:
+        return _STABLE_TABLES[0]
+
+    all_chars = _get_all_code_points()
+    decompositions = list(map(unicodedata.decomposition, all_chars))
+    has_decomposition = np.fromiter(
+        map(bool, decompositions), dtype=bool, count=NUM_CODE_POINTS)
+
+    composes_back = np.zeros(NUM_CODE_POINTS, dtype=bool)
+    for decomposition in filter(None, decompositions):
+        parts = decomposition.split()
+        if len(parts) == 2 and not parts[0].startswith('<'):
+            composes_back[int(parts[1], 16)] = True
+    for start, end in HANGUL_JAMO_RANGES:
+        composes_back[start:end] = True
+
+    combining_classes = np.fromiter(
+        map(unicodedata.combining, all_chars), dtype=np.uint8,
+        count=NUM_CODE_POINTS)
+    is_stable = ~composes_back & (combining_classes == 0)
+    for i in np.flatnonzero(is_stable & has_decomposition).tolist():
+        char = chr(i)
+        first = unicodedata.normalize('NFD', char)[0]
+        is_stable[i] = unicodedata.normalize('NFKC', char) == char and \
+            unicodedata.combining(first) == 0 and \
+            not composes_back[ord(first)]
+
+    _STABLE_TABLES.append(is_stable)
+    return is_stable
+
+
+def _shift_left(mask: np.ndarray) -> np.ndarray:
+    """mask[i + 1] at every position, False past the end."""
+    shifted = np.zeros_like(mask)
+    shifted[:-1] = mask[1:]
+    return shifted
+
+
+def _shift_right(mask: np.ndarray) -> np.ndarray:
+    """mask[i - 1] at every position, False before the start."""
+    shifted = np.zeros_like(mask)
+    shifted[1:] = mask[:-1]
+    return shifted
+
+
+def _encode(text: str) -> np.ndarray:
+    """Code points of a text."""
+    return np.frombuffer(
+        text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+
+
+def _get_run_starts(mask: np.ndarray) -> np.ndarray:
+    """Index of the start of the run of True each position belongs to."""
+    starts = mask & ~_shift_right(mask)
+    indices = np.where(starts, np.arange(len(mask)), 0)
+    return np.maximum.accumulate(indices)
+
+
+class BatchNormalizer(object):
+    """Vectorized :meth:`Normalizer.normalize` over batches of lines.
+
+    Usage:
+
+    >>> batch_normalizer = BatchNormalizer(normalizer)
+    >>> norm_texts: List[str] = batch_normalizer.normalize_batch(texts)
+    """
+
+    def __init__(self, normalizer: Normalizer):
+        """BatchNormalizer.
+
+        Args:
+            normalizer (Normalizer): Normalizer to reproduce.
+        """
+        self.normalizer = normalizer
+        self._supported = True
+
+        is_space, digit_values = get_unicode_tables(
+            normalizer.ignore_pattern, normalizer.num_pattern)
+        self._is_stable = get_nfkc_stable_table()
+
+        # Pseudo-spaces are no-break spaces, which NFKC already replaced
+        if normalizer.pseudo_num_pattern.pattern != '(\\d)\xa0(\\d)':
+            self._supported = False
+
+        values = np.arange(NUM_CODE_POINTS, dtype=np.uint32)
+        flags = np.zeros(NUM_CODE_POINTS, dtype=np.uint8)
+
+        is_digit = digit_values >= 0
+        values[is_digit] = ord('0') + digit_values[is_digit]
+        flags[is_digit] |= DIGIT
+        flags[digit_values == NO_DECIMAL] |= FALLBACK
+
+        # Doubled characters replaced as a pair, eg. "''" → '"'
+        self._pairs: List[Tuple[int, int]] = []
+        for key, value in (normalizer.punct_replace_map or {}).items():
+            if len(key) == 2 and key[0] == key[1] and len(value) == 1:
+                self._pairs.append((ord(key[0]), ord(value)))
+            elif len(key) != 1:
+                self._supported = False
+            elif len(value) == 0:
+                flags[ord(key)] |= DELETE
+            elif len(value) == 1:
+                values[ord(key)] = ord(value)
+            else:
+                flags[ord(key)] |= FALLBACK
+
+        flags[is_space[values]] |= SPACE
+
+        # Language specific replacements apply to the final characters
+        lang_values = np.arange(NUM_CODE_POINTS, dtype=np.uint32)
+        for key, value in (normalizer.lang_replace_map or {}).items():
+            if len(key) != 1 or len(value) != 1 or is_space[ord(value)]:
+                self._supported = False
+                continue
+            lang_values[ord(key)] = ord(value)
+        values = lang_values[values]
+        self._pairs = [
+            (char, lang_values[value]) for char, value in self._pairs]
+        if any(is_space[value] for _, value in self._pairs):
+            self._supported = False
+
+        self._values = values
+        self._flags = flags
+
+        # Longest digit run int() accepts
+        self._max_digits = 0
+        if hasattr(sys, 'get_int_max_str_digits'):
+            self._max_digits = sys.get_int_max_str_digits()
+
+    def normalize_batch(self, texts: List[str]) -> List[str]:
+        """Normalize many texts at once.
+
+        Args:
+            texts (List[str]): Input texts
+
+        Returns:
+            List[str]: Normalized texts, same as :meth:`Normalizer.normalize`
+            on each text.
+        """
+        texts = list(texts)
+        normalize = self.normalizer.normalize
+        if not self._supported or len(texts) == 0:
+            return [normalize(text) for text in texts]
+
+        # Lines are joined with newlines. A trailing newline would become
+        # trailing whitespace and be removed anyway, lines containing other
+        # newlines are left out.
+        lines = [t[:-1] if t.endswith('\n') else t for t in texts]
+        fallback = {i for i, line in enumerate(lines) if '\n' in line}
+        for i in fallback:
+            lines[i] = ''
+        codes = _encode('\n'.join(lines))
+
+        # Only lines with an unstable character can change, NFKC never
+        # merges characters across a newline
+        is_unstable = ~self._is_stable[codes]
+        if is_unstable.any():
+            line_is_unstable = np.zeros(len(lines), dtype=bool)
+            line_is_unstable[np.cumsum(codes == ord('\n'))[is_unstable]] = True
+            line_ids = np.flatnonzero(line_is_unstable).tolist()
+            if 2 * len(line_ids) > len(lines):
+                text = unicodedata.normalize('NFKC', '\n'.join(lines))
+            else:
+                norm_lines = unicodedata.normalize(
+                    'NFKC', '\n'.join([lines[i] for i in line_ids]))
+                for i, line in zip(line_ids, norm_lines.split('\n')):
+                    lines[i] = line
+                text = '\n'.join(lines)
+            codes = _encode(text)
+
+        is_sep = codes == ord('\n')
+        if np.count_nonzero(is_sep) != len(texts) - 1:
+            return [normalize(t) for t in texts]
+
+        flags = self._flags[codes]
+        values = self._values[codes]
+
+        needs_fallback = (flags & FALLBACK) != 0
+        delete = (flags & DELETE) != 0
+
+        # str(int(digits)), remove leading zeros but keep the last digit
+        is_digit = (flags & DIGIT) != 0
+        if is_digit.any():
+            run_starts = _get_run_starts(is_digit)
+            is_last = is_digit & ~_shift_left(is_digit)
+            if self._max_digits > 0:
+                run_lengths = np.arange(len(codes)) - run_starts + 1
+                needs_fallback |= is_last & (run_lengths > self._max_digits)
+
+            is_nonzero = is_digit & (values != ord('0'))
+            num_nonzero = np.cumsum(is_nonzero)
+            num_nonzero_before_run = \
+                num_nonzero[run_starts] - is_nonzero[run_starts]
+            is_leading = num_nonzero == num_nonzero_before_run
+            delete |= is_digit & is_leading & ~is_last
+
+        # Pairs are matched greedily from the left of each run
+        for char, value in self._pairs:
+            is_char = codes == char
+            if not is_char.any():
+                continue
+            offsets = np.arange(len(codes)) - _get_run_starts(is_char)
+            is_first = is_char & (offsets % 2 == 0) & _shift_left(is_char)
+            values[is_first] = value
+            delete |= _shift_right(is_first)
+
+        keep = ~delete
+        values = values[keep]
+        is_sep = is_sep[keep]
+        is_space = ((flags[keep] & SPACE) != 0) & ~is_sep
+        is_content = ~is_space & ~is_sep
+
+        # ' '.join(text.split()), keep the first space of runs between
+        # content of the same line
+        num_codes = len(values)
+        next_indices = np.where(is_space, num_codes, np.arange(num_codes))
+        next_indices = np.minimum.accumulate(next_indices[::-1])[::-1]
+        next_is_content = np.concatenate([is_content, [False]])[next_indices]
+        keep = is_content | is_sep | (
+            is_space & _shift_right(is_content) & next_is_content)
+        values = np.where(is_space, ord(' '), values)[keep]
+
+        results = values.astype('<u4').tobytes().decode('utf-32-le')
+        results = results.split('\n')
+
+        line_ids = np.cumsum(codes == ord('\n'))[needs_fallback]
+        fallback.update(np.unique(line_ids).tolist())
+        for i in fallback:
+            results[i] = normalize(texts[i])
+        return results
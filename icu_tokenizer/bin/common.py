@@ -0,0 +1,782 @@
+"""Shared input / output handling for the commandline tools."""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from typing import (BinaryIO, Callable, Iterator, List, Optional, Sequence,
+                    TextIO, Tuple)
+
+from tqdm import tqdm
+
+from icu_tokenizer.parallel import InFlightLimit, parallel_map_chunks
+from icu_tokenizer.profiling import clear_profiles, merge_profiles
+
+CHUNK_BYTES = 1 << 16
+PARQUET_BATCH_ROWS = 4096
+MIN_CHUNK_BYTES = 1 << 10
+MAX_CHUNK_BYTES = 1 << 24
+
+# (index of input file, byte offset into that file)
+Position = Tuple[int, int]
+
+
+def add_io_options(parser: argparse.ArgumentParser):
+    """Add input and output options to a parser."""
+    parser.add_argument(
+        '-i', '--inputs', type=str,
+        nargs='+', default=['-'],
+        help='Input files. Defaults to stdin.')
+    parser.add_argument(
+        '-o', '--output', type=str, default='-',
+        help='Output file. Defaults to stdout.')
+    parser.add_argument(
+        '--shard', type=parse_shard, default=None,
+        help='Only process shard i of N, given as i/N with 0 <= i < N. '
+        'Files are split into newline aligned byte ranges, stdin is split '
+        'by line number modulo N. Use the merge subcommand to reassemble '
+        'the outputs.')
+    parser.add_argument(
+        '--input-format', type=str, default='text',
+        choices=['text', 'jsonl', 'parquet'],
+        help='Format of the inputs, the output has the same format. For '
+        'jsonl and parquet only --field is processed, other fields are '
+        'kept. parquet requires pyarrow.')
+    parser.add_argument(
+        '--field', type=str, default='text',
+        help='Field to process for jsonl and parquet inputs')
+    parser.add_argument(
+        '--output-field', type=str, default=None,
+        help='Field to write results to for jsonl and parquet inputs. '
+        'Defaults to replacing --field.')
+
+
+def parse_shard(string: str) -> Tuple[int, int]:
+    """Parse a shard specification of the form ``i/N``."""
+    try:
+        shard_index, num_shards = (int(s) for s in string.split('/'))
+    except ValueError:
+        msg = "invalid shard '{}', expected i/N".format(string)
+        raise argparse.ArgumentTypeError(msg)
+    if not 0 <= shard_index < num_shards:
+        msg = "invalid shard '{}', expected 0 <= i < N".format(string)
+        raise argparse.ArgumentTypeError(msg)
+    return shard_index, num_shards
+
+
+def add_chunking_options(parser: argparse.ArgumentParser):
+    """Add parallelism, chunking, progress and profiling options."""
+    parser.add_argument(
+        '-j', '--num-workers', type=int, default=0,
+        help='Number of processes to use. 0 to process in the main '
+        'process, negative to use all cores.')
+    parser.add_argument(
+        '--auto-workers', action='store_true',
+        help='Start with 1 active worker and add workers while throughput '
+        'keeps improving, up to --num-workers (or all cores if it is not '
+        'positive).')
+    parser.add_argument(
+        '--chunk-bytes', type=int, default=CHUNK_BYTES,
+        help='Size in bytes of the chunks of lines sent to workers')
+    parser.add_argument(
+        '--chunk-time', type=float, default=None,
+        help='Adjust the chunk size from measured throughput so that a '
+        'chunk takes about this many seconds to process. --chunk-bytes is '
+        'then only the initial size.')
+    parser.add_argument(
+        '--show-pbar', action='store_true',
+        help='Show progressbar')
+    parser.add_argument(
+        '--telemetry', type=str, default=None,
+        help='Append throughput, chunk size and worker count as json lines '
+        'to this file')
+    parser.add_argument(
+        '--profile', type=str, default=None,
+        help='Profile every worker with cProfile and write the profiles, '
+        'merged into merged.prof (pstats) and merged.collapsed (collapsed '
+        'stacks for flamegraphs), to this directory')
+
+
+def add_runtime_options(parser: argparse.ArgumentParser):
+    """Add parallelism, chunking, progress and checkpointing options."""
+    add_chunking_options(parser)
+    parser.add_argument(
+        '--checkpoint', type=str, default=None,
+        help='Path of a checkpoint file. When given, progress is recorded '
+        'periodically and an interrupted run resumes from the last '
+        'checkpoint. Requires file inputs and output.')
+    parser.add_argument(
+        '--checkpoint-interval', type=float, default=60.,
+        help='Minimum number of seconds between checkpoints')
+
+
+class Checkpoint(object):
+    """Committed progress of a run.
+
+    Records the position in the inputs up to which all lines have been
+    processed and the size of the output at that point. Saving is atomic,
+    a checkpoint file is always either the previous or the next state.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        inputs: Sequence[str],
+        output: str,
+        options: Optional[dict] = None,
+    ):
+        """Checkpoint.
+
+        Args:
+            path (str): Path of the checkpoint file.
+            inputs (Sequence[str]): Input file paths.
+            output (str): Output file path.
+            options (Optional[dict], optional): JSON serializable options
+                deciding which lines are processed and how they are read
+                and written, a checkpoint only resumes a run with the same
+                options. Defaults to None.
+        """
+        self.path = path
+        self.inputs = list(inputs)
+        self.output = output
+        self.options = options or {}
+
+        self.position: Position = (0, 0)
+        self.output_size = 0
+        self.num_lines = 0
+
+    def load(self) -> bool:
+        """Load a previously saved state.
+
+        Returns:
+            bool: True if a saved state exists and was loaded.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        if state['inputs'] != self.inputs or state['output'] != self.output:
+            raise ValueError(
+                'Checkpoint {} was created for different inputs or output'
+                .format(self.path))
+        if state.get('options', {}) != self.options:
+            raise ValueError(
+                'Checkpoint {} was created with different options {}'
+                .format(self.path, state.get('options', {})))
+
+        self.position = tuple(state['position'])
+        self.output_size = state['output_size']
+        self.num_lines = state['num_lines']
+        return True
+
+    def save(self):
+        """Atomically write the current state to disk."""
+        state = {
+            'inputs': self.inputs,
+            'output': self.output,
+            'options': self.options,
+            'position': list(self.position),
+            'output_size': self.output_size,
+            'num_lines': self.num_lines,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Remove the checkpoint file."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def get_shard_ranges(
+    paths: Sequence[str],
+    shard_index: int,
+    num_shards: int,
+) -> List[Tuple[int, int]]:
+    """Find the byte ranges of each file belonging to a shard.
+
+    The files are treated as one combined stream which is split into
+    ``num_shards`` equally sized byte ranges. A line belongs to the shard
+    that contains its first byte, so every range starts and ends at a line
+    boundary and the shards together cover every line exactly once.
+
+    Args:
+        paths (Sequence[str]): Input file paths.
+        shard_index (int): Index of the shard.
+        num_shards (int): Total number of shards.
+
+    Returns:
+        List[Tuple[int, int]]: ``(begin, end)`` byte offsets for each file.
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    total_size = sum(sizes)
+    shard_begin = total_size * shard_index // num_shards
+    shard_end = total_size * (shard_index + 1) // num_shards
+
+    def align(f, offset):
+        # Move offset to the first line start at or after offset
+        if offset == 0:
+            return 0
+        f.seek(offset - 1)
+        return offset - 1 + len(f.readline())
+
+    ranges = []
+    file_begin = 0
+    for path, size in zip(paths, sizes):
+        begin = min(max(shard_begin - file_begin, 0), size)
+        end = min(max(shard_end - file_begin, 0), size)
+        with open(path, 'rb') as f:
+            ranges.append((align(f, begin), align(f, end)))
+        file_begin += size
+    return ranges
+
+
+def iter_input_lines(
+    paths: Sequence[str],
+    start: Position = (0, 0),
+    shard: Optional[Tuple[int, int]] = None,
+) -> Iterator[Tuple[str, Position]]:
+    """Read lines from a list of files, keeping track of byte positions.
+
+    Args:
+        paths (Sequence[str]): Input file paths, ``-`` for stdin.
+        start (Position, optional): Position to start reading from.
+            Defaults to the start of the first file.
+        shard (Optional[Tuple[int, int]], optional): Only read the lines of
+            shard ``(i, N)``. Defaults to reading all lines.
+
+    Yields:
+        Tuple[str, Position]: A line and the position right after it.
+    """
+    if shard is not None and '-' in paths:
+        if paths != ['-']:
+            raise ValueError('Cannot shard stdin together with files')
+        shard_index, num_shards = shard
+        for i, (line, position) in enumerate(iter_input_lines(paths)):
+            if i % num_shards == shard_index:
+                yield line, position
+        return
+
+    if shard is None:
+        ranges = [(0, None)] * len(paths)
+    else:
+        ranges = get_shard_ranges(paths, *shard)
+
+    for i, (path, (begin, end)) in enumerate(zip(paths, ranges)):
+        if i < start[0]:
+            continue
+        offset = max(start[1], begin) if i == start[0] else begin
+
+        if path == '-':
+            f = sys.stdin.buffer
+        else:
+            f = open(path, 'rb')
+        try:
+            if offset > 0:
+                f.seek(offset)
+            for raw_line in f:
+                if end is not None and offset >= end:
+                    break
+                offset += len(raw_line)
+                yield raw_line.decode('utf-8', errors='ignore'), (i, offset)
+        finally:
+            if f is not sys.stdin.buffer:
+                f.close()
+
+
+def get_num_bytes(line: str) -> int:
+    """Size of a line in bytes."""
+    return len(line.encode('utf-8'))
+
+
+def iter_sized_chunks(
+    lines: Iterator[Tuple[str, Position]],
+    tuner: 'Tuner',
+    get_size: Callable[[str], int] = get_num_bytes,
+) -> Iterator[Tuple[List[str], Position, int]]:
+    """Group lines into chunks of about ``tuner.chunk_bytes`` bytes.
+
+    Args:
+        lines (Iterator[Tuple[str, Position]]): Lines and their positions.
+        tuner (Tuner): Tuner setting the chunk size.
+        get_size (Callable[[str], int], optional): Size of a line in
+            bytes. Defaults to :func:`get_num_bytes`.
+
+    Yields:
+        Tuple[List[str], Position, int]: A chunk, the position right after
+        it and its size in bytes.
+    """
+    chunk = []
+    num_bytes = 0
+    position = None
+    for line, position in lines:
+        chunk.append(line)
+        num_bytes += get_size(line)
+        if num_bytes >= tuner.chunk_bytes:
+            yield chunk, position, num_bytes
+            chunk = []
+            num_bytes = 0
+    if len(chunk) > 0:
+        yield chunk, position, num_bytes
+
+
+class Tuner(InFlightLimit):
+    """Adjusts chunk size and number of active workers from throughput.
+
+    Throughput is measured over windows of ``window`` seconds, based on the
+    chunks reported through :meth:`record`. Pass the tuner as ``in_flight``
+    to :func:`icu_tokenizer.parallel.parallel_map_chunks` to limit the
+    number of chunks sent to the workers.
+
+    - With ``chunk_time``, the chunk size is set so that one worker takes
+      about ``chunk_time`` seconds per chunk.
+    - With ``auto_workers``, the number of chunks in flight (and so the
+      number of busy workers) starts at 1 and is increased after every
+      window in which throughput improved by at least 5%. Once it stops
+      improving, the best number of workers is kept.
+    """
+
+    def __init__(
+        self,
+        chunk_bytes: int = CHUNK_BYTES,
+        chunk_time: Optional[float] = None,
+        max_workers: int = 1,
+        auto_workers: bool = False,
+        window: float = 2.,
+    ):
+        """Tuner.
+
+        Args:
+            chunk_bytes (int, optional): (Initial) chunk size in bytes.
+                Defaults to CHUNK_BYTES.
+            chunk_time (Optional[float], optional): Target seconds of
+                processing per chunk. Defaults to None (fixed chunk size).
+            max_workers (int, optional): Number of workers in the pool.
+                Defaults to 1.
+            auto_workers (bool, optional): Ramp up the number of active
+                workers. Defaults to False.
+            window (float, optional): Measurement window in seconds.
+                Defaults to 2.
+        """
+        self.chunk_bytes = chunk_bytes
+        self.chunk_time = chunk_time
+        self.max_workers = max(max_workers, 1)
+        self.auto_workers = auto_workers
+        self.window = window
+
+        self.workers = 1 if auto_workers else self.max_workers
+        self.throughput = None  # bytes per second
+        self._settled = not auto_workers
+        self._best_throughput = None
+
+        # Without auto_workers, keep every worker busy with a spare chunk
+        super().__init__(
+            self.workers if auto_workers else 2 * self.max_workers)
+
+        self._window_start = time.time()
+        self._window_bytes = 0
+
+    def record(self, num_bytes: int) -> bool:
+        """Report a finished chunk.
+
+        Returns:
+            bool: True if a measurement window ended and settings may have
+            changed.
+        """
+        self._window_bytes += num_bytes
+        elapsed = time.time() - self._window_start
+        if elapsed < self.window:
+            return False
+
+        self.throughput = self._window_bytes / elapsed
+        if self.chunk_time is not None:
+            per_worker = self.throughput / self.workers
+            self.chunk_bytes = int(min(max(
+                per_worker * self.chunk_time, MIN_CHUNK_BYTES
+            ), MAX_CHUNK_BYTES))
+        if not self._settled:
+            self._adjust_workers()
+
+        self._window_start = time.time()
+        self._window_bytes = 0
+        return True
+
+    def _adjust_workers(self):
+        best = self._best_throughput
+        improved = best is None or self.throughput >= best * 1.05
+        with self._condition:
+            if improved:
+                self._best_throughput = self.throughput
+                if self.workers < self.max_workers:
+                    self.workers += 1
+                    self.limit = self.workers
+                    self._condition.notify_all()
+                else:
+                    self._settled = True
+            else:
+                self.workers -= 1
+                self.limit = self.workers
+                self._settled = True
+
+    def get_stats(self) -> dict:
+        """Get the current settings and last measured throughput."""
+        return {
+            'chunk_bytes': self.chunk_bytes,
+            'workers': self.workers,
+            'throughput_mbps': None if self.throughput is None
+            else self.throughput / 1e6,
+        }
+
+
+def get_num_workers(args: argparse.Namespace) -> int:
+    """Get the size of the worker pool from :func:`add_chunking_options`."""
+    num_workers = args.num_workers
+    if num_workers < 0 or (args.auto_workers and num_workers == 0):
+        num_workers = multiprocessing.cpu_count()
+    return num_workers
+
+
+def create_tuner(args: argparse.Namespace, num_workers: int) -> Tuner:
+    """Create a tuner from the options of :func:`add_chunking_options`."""
+    return Tuner(
+        chunk_bytes=args.chunk_bytes,
+        chunk_time=args.chunk_time,
+        max_workers=num_workers,
+        auto_workers=args.auto_workers
+    )
+
+
+def record_chunk(
+    tuner: Tuner,
+    num_bytes: int,
+    pbar: Optional[tqdm] = None,
+    telemetry: Optional[TextIO] = None,
+):
+    """Report a finished chunk to the tuner and show updated settings."""
+    if not tuner.record(num_bytes):
+        return
+    stats = tuner.get_stats()
+    if pbar is not None:
+        pbar.set_postfix(stats)
+    if telemetry is not None:
+        stats['time'] = time.time()
+        telemetry.write(json.dumps(stats) + '\n')
+        telemetry.flush()
+
+
+def open_output(path: str, resume_size: Optional[int] = None) -> BinaryIO:
+    """Open the output file in binary mode.
+
+    Args:
+        path (str): Output file path, ``-`` for stdout.
+        resume_size (Optional[int], optional): If given, keep the first
+            ``resume_size`` bytes of an existing output and append after it.
+            Otherwise the output is truncated.
+
+    Returns:
+        BinaryIO: Output file.
+    """
+    if path == '-':
+        return sys.stdout.buffer
+    if resume_size is None:
+        return open(path, 'wb')
+
+    if not os.path.exists(path):
+        if resume_size > 0:
+            raise ValueError(
+                'Cannot resume, output {} does not exist'.format(path))
+        return open(path, 'wb')
+
+    f = open(path, 'r+b')
+    f.truncate(resume_size)
+    f.seek(resume_size)
+    return f
+
+
+def make_jsonl_fn(
+    fn_factory: Callable[..., Callable[[object], object]],
+    factory_args: Sequence,
+    field: str,
+    output_field: Optional[str] = None,
+) -> Callable[[str], str]:
+    """Create a function processing one field of a json line.
+
+    Parsing and serialization happen in the workers along with the
+    processing itself. Null or missing values give null results, like
+    parquet inputs.
+    """
+    fn = fn_factory(*factory_args)
+    if output_field is None:
+        output_field = field
+
+    def jsonl_fn(line: str) -> str:
+        if len(line.strip()) == 0:
+            return ''
+        record = json.loads(line)
+        value = record.get(field)
+        record[output_field] = None if value is None else fn(value)
+        return json.dumps(record, ensure_ascii=False)
+
+    return jsonl_fn
+
+
+def get_arrow_type(result_type: str):
+    """Get the pyarrow type of results, ``'string'`` or ``'list<string>'``.
+
+    Results columns always get this type, inferring it would give the null
+    type to batches without any value.
+    """
+    import pyarrow as pa
+
+    if result_type == 'string':
+        return pa.string()
+    if result_type == 'list<string>':
+        return pa.list_(pa.string())
+    raise ValueError('Unknown result type {}'.format(result_type))
+
+
+def make_record_batch_fn(
+    fn_factory: Callable[..., Callable[[object], object]],
+    factory_args: Sequence,
+    field: str,
+    output_field: Optional[str] = None,
+    result_type: str = 'string',
+) -> Callable:
+    """Create a function processing one column of a pyarrow RecordBatch."""
+    import pyarrow as pa
+
+    fn = fn_factory(*factory_args)
+    if output_field is None:
+        output_field = field
+    column_type = get_arrow_type(result_type)
+
+    def record_batch_fn(batch: pa.RecordBatch) -> pa.RecordBatch:
+        names = list(batch.schema.names)
+        values = batch.column(names.index(field)).to_pylist()
+        column = pa.array(
+            [None if v is None else fn(v) for v in values], column_type)
+
+        arrays = list(batch.columns)
+        if output_field in names:
+            arrays[names.index(output_field)] = column
+        else:
+            names.append(output_field)
+            arrays.append(column)
+        return pa.RecordBatch.from_arrays(arrays, names)
+
+    return record_batch_fn
+
+
+def run_parquet(
+    args: argparse.Namespace,
+    fn_factory: Callable[..., Callable[[str], object]],
+    factory_args: Sequence,
+    result_type: str = 'string',
+):
+    """Process a column of parquet inputs, see :func:`run`.
+
+    Record batches are read column-wise and each is sent to a worker as a
+    whole.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required for --input-format parquet')
+
+    if '-' in args.inputs or args.output == '-':
+        raise ValueError('parquet requires file inputs and output')
+    if args.shard is not None or args.checkpoint is not None:
+        raise ValueError(
+            '--shard and --checkpoint are not supported for parquet')
+
+    num_workers = get_num_workers(args)
+
+    # Output schema is known upfront so that inputs without rows still give
+    # an output file
+    schema = pq.ParquetFile(args.inputs[0]).schema_arrow
+    output_field = args.output_field or args.field
+    column = pa.field(output_field, get_arrow_type(result_type))
+    if output_field in schema.names:
+        schema = schema.set(schema.get_field_index(output_field), column)
+    else:
+        schema = schema.append(column)
+
+    def create_chunk_input_stream():
+        for path in args.inputs:
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(PARQUET_BATCH_ROWS):
+                yield [batch]
+
+    pbar = None
+    if args.show_pbar:
+        pbar = tqdm()
+
+    if args.profile is not None:
+        clear_profiles(args.profile)
+
+    writer = pq.ParquetWriter(args.output, schema)
+    for results in parallel_map_chunks(
+        make_record_batch_fn,
+        [
+            fn_factory, factory_args, args.field, args.output_field,
+            result_type
+        ],
+        create_chunk_input_stream(),
+        workers=num_workers,
+        profile_dir=args.profile
+    ):
+        table = pa.Table.from_batches(results)
+        writer.write_table(table)
+        if pbar is not None:
+            pbar.update(table.num_rows)
+
+    writer.close()
+    if pbar is not None:
+        pbar.close()
+    if args.profile is not None:
+        report_profiles(args.profile)
+
+
+def report_profiles(profile_dir: str):
+    """Merge worker profiles and print where they were written."""
+    pstats_path, collapsed_path = merge_profiles(profile_dir)
+    sys.stderr.write('Profiles written to {} and {}\n'.format(
+        pstats_path, collapsed_path))
+
+
+def format_line(line: str) -> str:
+    """Format an already serialized line."""
+    return line + '\n'
+
+
+def run(
+    args: argparse.Namespace,
+    fn_factory: Callable[..., Callable[[str], object]],
+    factory_args: Sequence,
+    format_fn: Callable[[object], str],
+    batched: bool = False,
+    result_type: str = 'string',
+):
+    """Process the inputs with a pool of workers and write the results.
+
+    Args:
+        args (argparse.Namespace): Arguments added by
+            :func:`add_io_options` and :func:`add_runtime_options`.
+        fn_factory (Callable[..., Callable[[str], object]]): Picklable
+            function creating the function applied on each line, see
+            :func:`icu_tokenizer.parallel.parallel_map_chunks`.
+        factory_args (Sequence): Arguments for ``fn_factory``.
+        format_fn (Callable[[object], str]): Function turning a single
+            result into the text to write.
+        batched (bool, optional): The function created by ``fn_factory``
+            is applied on whole chunks of lines, only supported for text
+            inputs. Defaults to False.
+        result_type (str, optional): Type of the results in parquet
+            outputs, see :func:`get_arrow_type`. Defaults to 'string'.
+    """
+    if batched and args.input_format != 'text':
+        raise ValueError('Batched processing requires text inputs')
+    if args.input_format == 'parquet':
+        run_parquet(args, fn_factory, factory_args, result_type)
+        return
+    if args.input_format == 'jsonl':
+        factory_args = [
+            fn_factory, factory_args, args.field, args.output_field]
+        fn_factory = make_jsonl_fn
+        format_fn = format_line
+
+    checkpoint = None
+    resume_size = None
+    if args.checkpoint is not None:
+        if '-' in args.inputs or args.output == '-':
+            raise ValueError('--checkpoint requires file inputs and output')
+        checkpoint = Checkpoint(args.checkpoint, args.inputs, args.output, {
+            'shard': None if args.shard is None else list(args.shard),
+            'input_format': args.input_format,
+            'field': args.field,
+            'output_field': args.output_field,
+        })
+        if checkpoint.load():
+            resume_size = checkpoint.output_size
+        else:
+            resume_size = 0
+    start = (0, 0) if checkpoint is None else checkpoint.position
+
+    num_workers = get_num_workers(args)
+    tuner = create_tuner(args, num_workers)
+
+    # Results arrive in the same order as chunks are sent out, so the
+    # position of each chunk can be passed along through a queue.
+    positions = deque()
+
+    def create_chunk_input_stream():
+        lines = iter_input_lines(args.inputs, start, args.shard)
+        for chunk, position, num_bytes in iter_sized_chunks(lines, tuner):
+            positions.append((position, num_bytes))
+            yield chunk
+
+    pbar = None
+    if args.show_pbar:
+        pbar = tqdm(initial=0 if checkpoint is None else checkpoint.num_lines)
+
+    telemetry = None
+    if args.telemetry is not None:
+        telemetry = open(args.telemetry, 'a', encoding='utf-8')
+
+    if args.profile is not None:
+        clear_profiles(args.profile)
+
+    output = open_output(args.output, resume_size)
+    last_saved = time.time()
+    try:
+        for results in parallel_map_chunks(
+            fn_factory, factory_args, create_chunk_input_stream(),
+            workers=num_workers,
+            profile_dir=args.profile,
+            batched=batched,
+            in_flight=tuner
+        ):
+            position, num_bytes = positions.popleft()
+            for result in results:
+                output.write(format_fn(result).encode('utf-8'))
+            if pbar is not None:
+                pbar.update(len(results))
+
+            record_chunk(tuner, num_bytes, pbar, telemetry)
+
+            if checkpoint is None:
+                continue
+            checkpoint.position = position
+            checkpoint.num_lines += len(results)
+            if time.time() - last_saved >= args.checkpoint_interval:
+                output.flush()
+                os.fsync(output.fileno())
+                checkpoint.output_size = output.tell()
+                checkpoint.save()
+                last_saved = time.time()
+    finally:
+        # Unblock the input stream if processing stopped early
+        tuner.close()
+    output.flush()
+
+    if output is not sys.stdout.buffer:
+        output.close()
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    if telemetry is not None:
+        telemetry.close()
+    if pbar is not None:
+        pbar.close()
+    if args.profile is not None:
+        report_profiles(args.profile)
@@ -0,0 +1,60 @@
+"""Merge the outputs of a sharded run back into the original order."""
+
+import sys
+import shutil
+import argparse
+
+from icu_tokenizer.bin.common import open_output
+
+
+def add_options(parser: argparse.ArgumentParser):
+    """Add options to a parser."""
+    parser.add_argument(
+        '-i', '--inputs', type=str, nargs='+', required=True,
+        help='Shard outputs, ordered by shard index.')
+    parser.add_argument(
+        '-o', '--output', type=str, default='-',
+        help='Output file. Defaults to stdout.')
+    parser.add_argument(
+        '--interleave', action='store_true',
+        help='Interleave lines round robin, for shards of stdin which were '
+        'split by line number. Requires one output line per input line, '
+        'so it does not work for split. By default shards are concatenated.')
+
+
+def main(args: argparse.Namespace):  # noqa
+    output = open_output(args.output)
+    if args.interleave:
+        interleave(args.inputs, output)
+    else:
+        for path in args.inputs:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, output)
+    output.flush()
+
+    if output is not sys.stdout.buffer:
+        output.close()
+
+
+def interleave(paths, output):  # noqa
+    files = [open(path, 'rb') for path in paths]
+    try:
+        done = False
+        while not done:
+            for i, f in enumerate(files):
+                line = f.readline()
+                if line:
+                    if done:
+                        raise ValueError(
+                            'Shard {} has more lines than expected'
+                            .format(paths[i]))
+                    output.write(line)
+                else:
+                    done = True
+        for path, f in zip(paths, files):
+            if f.readline():
+                raise ValueError(
+                    'Shard {} has more lines than expected'.format(path))
+    finally:
+        for f in files:
+            f.close()
@@ -1,14 +1,10 @@
 """Normalize text using unicode properties."""
 
-import sys
 import argparse
+from typing import Callable, List
 
-from tqdm import tqdm
-
+from icu_tokenizer.bin.common import add_io_options, add_runtime_options, run
 from icu_tokenizer.normalizer import Normalizer
-from icu_tokenizer.utils import TextFileType
-
-CACHE = {}
 
 
 def add_options(parser: argparse.ArgumentParser):
@@ -22,72 +18,51 @@ def add_options(parser: argparse.ArgumentParser):
     parser.add_argument(
         '-lc', '--lowercase', action='store_true',
         help='Cast all characters to lowercase')
-
-    parser.add_argument(
-        '-i', '--inputs', type=TextFileType('r'),
-        nargs='+', default=[sys.stdin],
-        help='Input files. Defaults to stdin.')
     parser.add_argument(
-        '-o', '--output', type=TextFileType('w'), default=sys.stdout,
-        help='Output file. Defaults to stdout.')
+        '--vectorized', action='store_true',
+        help='Normalize whole chunks at once with NumPy, '
+        'only for text inputs')
 
-    parser.add_argument(
-        '-j', '--num-workers', type=int, default=0,
-        help='Number of processes to use')
-    parser.add_argument(
-        '--show-pbar', action='store_true',
-        help='Show progressbar')
+    add_io_options(parser)
+    add_runtime_options(parser)
 
 
 def main(args: argparse.Namespace):  # noqa
-    if args.num_workers == 0:
-        import multiprocessing.dummy as multiprocessing
-        args.num_workers = 1
-    else:
-        import multiprocessing
-
-    if args.num_workers < 0:  # Use all cores
-        args.num_workers = multiprocessing.cpu_count()
-
-    def create_chunk_input_stream():
-        chunk = []
-        for f in args.inputs:
-            for line in f:
-                chunk.append(line)
-                if len(chunk) >= 256:
-                    yield chunk
-                    chunk = []
-        if len(chunk) > 0:
-            yield chunk
-
-    pbar = None
-    if args.show_pbar:
-        pbar = tqdm()
-
-    with multiprocessing.Pool(
-        args.num_workers,
-        initializer=worker_init_fn,
-        initargs=[args.lang, args.norm_puncts, args.lowercase]
-    ) as pool:
-        for chunk in pool.imap(worker_fn, create_chunk_input_stream()):
-            if pbar is not None:
-                pbar.update(len(chunk))
-            for line in chunk:
-                args.output.write(line + '\n')
-    args.output.flush()
-
-    if pbar is not None:
-        pbar.close()
-
-
-def worker_init_fn(lang: str, norm_puncts: bool, lowercase: bool):  # noqa
-    CACHE['normalizer'] = Normalizer(lang, norm_puncts)
-    CACHE['lowercase'] = lowercase
-
-
-def worker_fn(texts):  # noqa
-    normalize_fn = CACHE['normalizer'].normalize
-    texts = [normalize_fn(t) for t in texts]
-    if CACHE['lowercase']:
-        texts = [t.lower() for t in texts]
-    return texts
+    fn_factory = make_normalize_fn
+    if args.vectorized:
+        fn_factory = make_normalize_batch_fn
+    run(
+        args,
+        fn_factory,
+        [args.lang, args.norm_puncts, args.lowercase],
+        format_fn,
+        batched=args.vectorized
+    )
+
+
+def make_normalize_fn(
+    lang: str,
+    norm_puncts: bool,
+    lowercase: bool
+) -> Callable[[str], str]:
+    """Create the function applied on each line by the workers."""
+    normalize_fn = Normalizer(lang, norm_puncts).normalize
+    if not lowercase:
+        return normalize_fn
+    return lambda text: normalize_fn(text).lower()
+
+
+def make_normalize_batch_fn(
+    lang: str,
+    norm_puncts: bool,
+    lowercase: bool
+) -> Callable[[List[str]], List[str]]:
+    """Create the function applied on each chunk of lines by the workers."""
+    normalize_batch_fn = Normalizer(lang, norm_puncts).normalize_batch
+    if not lowercase:
+        return normalize_batch_fn
+    return lambda texts: [text.lower() for text in normalize_batch_fn(texts)]
+
+
+def format_fn(text: str) -> str:  # noqa
+    return text + '\n'
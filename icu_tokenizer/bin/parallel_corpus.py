@@ -0,0 +1,245 @@
+"""Normalize, tokenize and filter aligned files in lockstep.
+
+With ``--shard i/N`` only rows whose line number modulo N is i are
+processed. Merge each side's shard outputs with ``merge --interleave`` to
+get the rows back in their original order. Filters remove rows from some
+shards and not others, so the shards then no longer interleave. Merge them
+without ``--interleave`` instead. The sides stay aligned but the order of
+the rows changes.
+"""
+
+import sys
+import argparse
+from collections import deque
+from itertools import zip_longest
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from tqdm import tqdm
+
+from icu_tokenizer.bin.common import (Position, add_chunking_options,
+                                      create_tuner, get_num_bytes,
+                                      get_num_workers, iter_input_lines,
+                                      iter_sized_chunks, open_output,
+                                      parse_shard, record_chunk,
+                                      report_profiles)
+from icu_tokenizer.normalizer import Normalizer
+from icu_tokenizer.parallel import parallel_map_chunks
+from icu_tokenizer.profiling import clear_profiles
+from icu_tokenizer.tokenizer import Tokenizer
+
+
+def add_options(parser: argparse.ArgumentParser):
+    """Add options to a parser."""
+    parser.add_argument(
+        '-i', '--inputs', type=str, nargs='+', required=True,
+        help='Aligned input files, one per side.')
+    parser.add_argument(
+        '-o', '--outputs', type=str, nargs='+', required=True,
+        help='Output files, one per side.')
+    parser.add_argument(
+        '-l', '--langs', type=str, nargs='+', required=True,
+        help='Language identifier of each side.')
+    parser.add_argument(
+        '--shard', type=parse_shard, default=None,
+        help='Only process shard i of N, given as i/N with 0 <= i < N. '
+        'Rows are split by line number modulo N, since the sides have '
+        'different byte ranges. Use merge --interleave on each side to '
+        'reassemble the outputs, or plain merge if filters removed rows.')
+
+    parser.add_argument(
+        '--normalize', action='store_true',
+        help='Normalize each side')
+    parser.add_argument(
+        '-p', '--norm-puncts', action='store_true',
+        help='Normalize punctuations')
+    parser.add_argument(
+        '-lc', '--lowercase', action='store_true',
+        help='Cast all characters to lowercase')
+    parser.add_argument(
+        '--tokenize', action='store_true',
+        help='Tokenize each side')
+    parser.add_argument(
+        '-a', '--annotate-hyphens', action='store_true',
+        help='Annotate hyphens similar to moses')
+    parser.add_argument(
+        '-url', '--protect-urls', action='store_true',
+        help='Protect url patterns')
+
+    parser.add_argument(
+        '--remove-empty', action='store_true',
+        help='Remove lines where any side is empty')
+    parser.add_argument(
+        '--max-tokens', type=int, default=None,
+        help='Remove lines where any side has more tokens than this')
+    parser.add_argument(
+        '--max-ratio', type=float, default=None,
+        help='Remove lines where the ratio between the number of tokens of '
+        'the longest and shortest side exceeds this')
+
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help='Print the number of removed lines to stderr')
+
+    add_chunking_options(parser)
+
+
+def main(args: argparse.Namespace):  # noqa
+    if not len(args.inputs) == len(args.outputs) == len(args.langs):
+        raise ValueError(
+            'Expected the same number of inputs, outputs and langs')
+
+    num_workers = get_num_workers(args)
+    tuner = create_tuner(args, num_workers)
+
+    # Results arrive in the same order as chunks are sent out
+    chunk_sizes = deque()
+
+    def create_chunk_input_stream():
+        sides = [iter_input_lines([path]) for path in args.inputs]
+        rows = (check_aligned(row) for row in zip_longest(*sides))
+        if args.shard is not None:
+            shard_index, num_shards = args.shard
+            rows = (
+                row for i, row in enumerate(rows)
+                if i % num_shards == shard_index
+            )
+        for chunk, _, num_bytes in iter_sized_chunks(
+            rows, tuner, get_row_num_bytes
+        ):
+            chunk_sizes.append(num_bytes)
+            yield chunk
+
+    pbar = None
+    if args.show_pbar:
+        pbar = tqdm()
+
+    telemetry = None
+    if args.telemetry is not None:
+        telemetry = open(args.telemetry, 'a', encoding='utf-8')
+
+    if args.profile is not None:
+        clear_profiles(args.profile)
+
+    outputs = [open_output(path) for path in args.outputs]
+    num_lines = num_kept = 0
+    try:
+        for results in parallel_map_chunks(
+            make_lockstep_fn,
+            [
+                args.langs, args.normalize, args.norm_puncts,
+                args.lowercase, args.tokenize, args.annotate_hyphens,
+                args.protect_urls,
+                args.remove_empty, args.max_tokens, args.max_ratio
+            ],
+            create_chunk_input_stream(),
+            workers=num_workers,
+            profile_dir=args.profile,
+            in_flight=tuner
+        ):
+            for row in results:
+                if row is None:
+                    continue
+                for output, text in zip(outputs, row):
+                    output.write((text + '\n').encode('utf-8'))
+                num_kept += 1
+            num_lines += len(results)
+            if pbar is not None:
+                pbar.update(len(results))
+            record_chunk(tuner, chunk_sizes.popleft(), pbar, telemetry)
+    finally:
+        # Unblock the input stream if processing stopped early
+        tuner.close()
+
+    for output in outputs:
+        output.flush()
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    if telemetry is not None:
+        telemetry.close()
+    if pbar is not None:
+        pbar.close()
+    if args.profile is not None:
+        report_profiles(args.profile)
+    if args.verbose:
+        sys.stderr.write('Kept {} of {} lines, removed {}\n'.format(
+            num_kept, num_lines, num_lines - num_kept))
+
+
+def check_aligned(
+    row: Tuple[Optional[Tuple[str, Position]], ...]
+) -> Tuple[Tuple[str, ...], Tuple[Position, ...]]:
+    """Turn a row of (line, position) pairs into lines and positions."""
+    if any(side is None for side in row):
+        raise ValueError('Inputs have different numbers of lines')
+    lines, positions = zip(*row)
+    return lines, positions
+
+
+def get_row_num_bytes(lines: Tuple[str, ...]) -> int:
+    """Size of a row of aligned lines in bytes."""
+    return sum(get_num_bytes(line) for line in lines)
+
+
+def make_lockstep_fn(
+    langs: Sequence[str],
+    normalize: bool = False,
+    norm_puncts: bool = False,
+    lowercase: bool = False,
+    tokenize: bool = False,
+    annotate_hyphens: bool = False,
+    protect_urls: bool = False,
+    remove_empty: bool = False,
+    max_tokens: Optional[int] = None,
+    max_ratio: Optional[float] = None,
+) -> Callable[[Sequence[str]], Optional[Tuple[str, ...]]]:
+    """Create the function applied on each row of aligned lines.
+
+    The function returns the processed sides, or None if the row is
+    removed by one of the filters.
+    """
+    side_fns: List[Callable[[str], List[str]]] = []
+    for lang in langs:
+        normalize_fn = None
+        if normalize:
+            normalize_fn = Normalizer(lang, norm_puncts).normalize
+        tokenize_fn = str.split
+        if tokenize:
+            tokenize_fn = Tokenizer(
+                lang,
+                annotate_hyphens=annotate_hyphens,
+                protect_emails_urls=protect_urls
+            ).tokenize
+        side_fns.append(make_side_fn(normalize_fn, lowercase, tokenize_fn))
+
+    def lockstep_fn(row):
+        sides = [side_fn(text) for side_fn, text in zip(side_fns, row)]
+        lengths = [len(tokens) for tokens in sides]
+
+        if remove_empty and min(lengths) == 0:
+            return None
+        if max_tokens is not None and max(lengths) > max_tokens:
+            return None
+        if max_ratio is not None and \
+                max(lengths) > max_ratio * max(min(lengths), 1):
+            return None
+
+        return tuple(' '.join(tokens) for tokens in sides)
+
+    return lockstep_fn
+
+
+def make_side_fn(
+    normalize_fn: Optional[Callable[[str], str]],
+    lowercase: bool,
+    tokenize_fn: Callable[[str], List[str]],
+) -> Callable[[str], List[str]]:
+    """Create the function turning the text of one side into tokens."""
+    def side_fn(text):
+        if normalize_fn is not None:
+            text = normalize_fn(text)
+        if lowercase:
+            text = text.lower()
+        return tokenize_fn(text)
+
+    return side_fn
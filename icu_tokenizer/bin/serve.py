@@ -0,0 +1,89 @@
+"""Serve normalize, tokenize and split requests over a socket."""
+
+import sys
+import json
+import asyncio
+import argparse
+
+from icu_tokenizer.server import DEFAULT_PORT, LINE_LIMIT, Server
+
+
+def add_options(parser: argparse.ArgumentParser):
+    """Add options to a parser."""
+    parser.add_argument(
+        '-l', '--lang', type=str, default='en',
+        help='Default language identifier')
+    parser.add_argument(
+        '--langs', type=str, nargs='+', default=None,
+        help='Other languages accepted in requests. '
+        'Defaults to any language.')
+    parser.add_argument(
+        '-p', '--norm-puncts', action='store_true',
+        help='Normalize punctuations')
+    parser.add_argument(
+        '-a', '--annotate-hyphens', action='store_true',
+        help='Annotate hyphens similar to moses')
+    parser.add_argument(
+        '-url', '--protect-urls', action='store_true',
+        help='Protect url patterns')
+
+    parser.add_argument(
+        '--unix', type=str, default=None,
+        help='Listen on a unix socket at this path instead of TCP')
+    parser.add_argument(
+        '--host', type=str, default='127.0.0.1',
+        help='TCP host')
+    parser.add_argument(
+        '--port', type=int, default=DEFAULT_PORT,
+        help='TCP port')
+
+    parser.add_argument(
+        '-j', '--num-workers', type=int, default=1,
+        help='Number of worker processes')
+    parser.add_argument(
+        '--max-batch-size', type=int, default=64,
+        help='Maximum number of requests processed as one batch')
+    parser.add_argument(
+        '--max-wait', type=float, default=0.002,
+        help='Maximum number of seconds a request waits for its batch')
+    parser.add_argument(
+        '--line-limit', type=int, default=LINE_LIMIT,
+        help='Maximum size of a request in bytes')
+    parser.add_argument(
+        '--stats-interval', type=float, default=0,
+        help='Print latency and queue statistics to stderr every this many '
+        'seconds. 0 to disable.')
+
+
+async def print_stats(server: Server, interval: float):  # noqa
+    while True:
+        await asyncio.sleep(interval)
+        sys.stderr.write(json.dumps(server.get_stats()) + '\n')
+        sys.stderr.flush()
+
+
+def main(args: argparse.Namespace):  # noqa
+    server = Server(
+        lang=args.lang,
+        langs=args.langs,
+        norm_puncts=args.norm_puncts,
+        annotate_hyphens=args.annotate_hyphens,
+        protect_emails_urls=args.protect_urls,
+        num_workers=args.num_workers,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait,
+        line_limit=args.line_limit
+    )
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start(
+        unix_path=args.unix, host=args.host, port=args.port))
+    if args.stats_interval > 0:
+        asyncio.ensure_future(print_stats(server, args.stats_interval))
+
+    try:
+        loop.run_until_complete(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
@@ -1,25 +1,15 @@
 """Tokenize text using unicode properties."""
 
-import sys
 import argparse
+from typing import Callable, Optional
 
-from tqdm import tqdm
-
+from icu_tokenizer.bin.common import add_io_options, add_runtime_options, run
 from icu_tokenizer.tokenizer import Tokenizer
-from icu_tokenizer.utils import TextFileType
-
-CACHE = {}
 
 
 def add_options(parser: argparse.ArgumentParser):
     """Add options to a parser."""
-    parser.add_argument(
-        '-i', '--inputs', type=TextFileType('r'),
-        nargs='+', default=[sys.stdin],
-        help='Input files. Defaults to stdin.')
-    parser.add_argument(
-        '-o', '--output', type=TextFileType('w'), default=sys.stdout,
-        help='Output file. Defaults to stdout.')
+    add_io_options(parser)
 
     parser.add_argument(
         '-l', '--lang', type=str, default='en',
@@ -30,64 +20,50 @@ def add_options(parser: argparse.ArgumentParser):
     parser.add_argument(
         '-url', '--protect-urls', action='store_true',
         help='Protect url patterns')
-
     parser.add_argument(
-        '-j', '--num-workers', type=int, default=0,
-        help='Number of processes to use')
+        '--break-rules', type=str, default=None,
+        help='File containing custom ICU word break rules')
     parser.add_argument(
-        '--show-pbar', action='store_true',
-        help='Show progressbar')
-
+        '--cache-break-rules', action='store_true',
+        help='Load compiled --break-rules from the on disk cache')
 
-def main(args: argparse.Namespace):  # noqa
-    if args.num_workers == 0:
-        import multiprocessing.dummy as multiprocessing
-        args.num_workers = 1
-    else:
-        import multiprocessing
+    add_runtime_options(parser)
 
-    if args.num_workers < 0:  # Use all cores
-        args.num_workers = multiprocessing.cpu_count()
 
-    def create_chunk_input_stream():
-        chunk = []
-        for f in args.inputs:
-            for line in f:
-                chunk.append(line)
-                if len(chunk) >= 256:
-                    yield chunk
-                    chunk = []
-        if len(chunk) > 0:
-            yield chunk
-
-    pbar = None
-    if args.show_pbar:
-        pbar = tqdm()
-
-    with multiprocessing.Pool(
-        args.num_workers,
-        initializer=worker_init_fn,
-        initargs=[args.lang, args.annotate_hyphens, args.protect_urls]
-    ) as pool:
-        for chunk in pool.imap(worker_fn, create_chunk_input_stream()):
-            if pbar is not None:
-                pbar.update(len(chunk))
-            for line in chunk:
-                args.output.write(line + '\n')
-    args.output.flush()
-
-    if pbar is not None:
-        pbar.close()
+def main(args: argparse.Namespace):  # noqa
+    break_rules = None
+    if args.break_rules is not None:
+        with open(args.break_rules, 'r', encoding='utf-8') as f:
+            break_rules = f.read()
+
+    run(
+        args,
+        make_tokenize_fn,
+        [
+            args.lang, args.annotate_hyphens, args.protect_urls,
+            break_rules, args.cache_break_rules
+        ],
+        format_fn
+    )
 
 
-def worker_init_fn(lang: str, annotate_hyphens: bool, protect_urls: bool):  # noqa
-    CACHE['tokenizer'] = Tokenizer(
+def make_tokenize_fn(
+    lang: str,
+    annotate_hyphens: bool,
+    protect_urls: bool,
+    break_rules: Optional[str] = None,
+    cache_break_rules: bool = False,
+) -> Callable[[str], str]:
+    """Create the function applied on each line by the workers."""
+    tokenize_fn = Tokenizer(
         lang,
         annotate_hyphens=annotate_hyphens,
-        protect_urls=protect_urls
-    )
+        protect_emails_urls=protect_urls,
+        break_rules=break_rules,
+        cache_break_rules=cache_break_rules
+    ).tokenize
+    return lambda text: ' '.join(tokenize_fn(text))
 
 
-def worker_fn(texts):  # noqa
-    tokenize_fn = CACHE['tokenizer'].tokenize
-    return [' '.join(tokenize_fn(t)) for t in texts]
+def format_fn(text: str) -> str:  # noqa
+    return text + '\n'
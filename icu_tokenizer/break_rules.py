@@ -0,0 +1,147 @@
+"""Compilation of custom ICU break rules with an on disk cache.
+
+Compiling a custom rule set takes milliseconds and has to be done by every
+process that uses it. The compiled (binary) rules can instead be stored on
+disk once per ICU version and loaded directly.
+
+Iterators for a locale are not cached, ICU already caches the locale data
+and creates them faster than they can be loaded from binary rules.
+
+Usage:
+
+>>> break_iterator = compile_break_rules(rules, use_cache=True)
+
+The cache directory defaults to ``~/.cache/icu_tokenizer`` and can be
+changed with the ``ICU_TOKENIZER_CACHE`` environment variable.
+"""
+
+import hashlib
+import os
+from typing import Callable, Dict, Optional
+
+import icu
+from icu import BreakIterator, RuleBasedBreakIterator
+
+__all__ = ['get_cache_dir', 'compile_break_rules']
+
+# Binary rules already loaded by this process
+_BINARY_RULES: Dict[str, bytes] = {}
+
+# Set to False once PyICU is found unable to load binary rules
+_BINARY_RULES_SUPPORTED = True
+
+
+def get_cache_dir() -> str:
+    """Get the directory for binary rules of the installed ICU version."""
+    cache_root = os.environ.get(
+        'ICU_TOKENIZER_CACHE',
+        os.path.join(os.path.expanduser('~'), '.cache', 'icu_tokenizer')
+    )
+    return os.path.join(cache_root, 'icu-{}'.format(icu.ICU_VERSION))
+
+
+def _from_binary_rules(binary_rules: bytes) -> Optional[BreakIterator]:
+    """Load binary rules, None if they are invalid or PyICU can't load them."""
+    global _BINARY_RULES_SUPPORTED
+    try:
+        break_iterator = RuleBasedBreakIterator(binary_rules)
+    except (TypeError, icu.InvalidArgsError):
+        # Older versions of PyICU can only compile rules from source
+        _BINARY_RULES_SUPPORTED = False
+        return None
+    except (ValueError, icu.ICUError):
+        return None
+
+    if break_iterator.getBinaryRules() != binary_rules:
+        return None
+    return break_iterator
+
+
+def _read_binary_rules(path: str) -> Optional[bytes]:
+    if path in _BINARY_RULES:
+        return _BINARY_RULES[path]
+    try:
+        with open(path, 'rb') as f:
+            binary_rules = f.read()
+    except OSError:
+        return None
+    _BINARY_RULES[path] = binary_rules
+    return binary_rules
+
+
+def _write_binary_rules(path: str, binary_rules: bytes):
+    # The cache is an optimization, an unusable cache directory only means
+    # the rules get compiled again next time
+    _BINARY_RULES[path] = binary_rules
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(binary_rules)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _create_cached(
+    cache_name: str,
+    create_fn: Callable[[], BreakIterator],
+    cache_dir: Optional[str] = None,
+) -> BreakIterator:
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    path = os.path.join(cache_dir, cache_name + '.brk')
+
+    global _BINARY_RULES_SUPPORTED
+    if not _BINARY_RULES_SUPPORTED:
+        return create_fn()
+
+    binary_rules = _read_binary_rules(path)
+    if binary_rules is not None:
+        break_iterator = _from_binary_rules(binary_rules)
+        if break_iterator is not None:
+            return break_iterator
+
+    break_iterator = create_fn()
+    if not _BINARY_RULES_SUPPORTED or not isinstance(
+        break_iterator, RuleBasedBreakIterator
+    ):
+        return break_iterator
+
+    new_binary_rules = break_iterator.getBinaryRules()
+    if new_binary_rules != binary_rules:
+        # Missing, corrupt or stale cache file
+        _write_binary_rules(path, new_binary_rules)
+    elif binary_rules is not None:
+        # Freshly compiled rules could not be loaded either
+        _BINARY_RULES_SUPPORTED = False
+    return break_iterator
+
+
+def compile_break_rules(
+    rules: str,
+    use_cache: bool = True,
+    cache_dir: Optional[str] = None,
+) -> BreakIterator:
+    """Create a break iterator from custom ICU break rules.
+
+    Args:
+        rules (str): Break rules in ICU rule syntax.
+        use_cache (bool, optional): Compile the rules only once and reuse
+            the binary rules afterwards. Defaults to True.
+        cache_dir (Optional[str], optional): Cache directory.
+            Defaults to :func:`get_cache_dir`.
+
+    Returns:
+        BreakIterator: Break iterator for the rules.
+    """
+    if not use_cache:
+        return RuleBasedBreakIterator(rules)
+
+    rules_hash = hashlib.sha1(rules.encode('utf-8')).hexdigest()
+    return _create_cached(
+        'rules-{}'.format(rules_hash),
+        lambda: RuleBasedBreakIterator(rules),
+        cache_dir
+    )
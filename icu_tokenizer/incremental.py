@@ -0,0 +1,239 @@
+"""Incremental tokenization and sentence splitting of edited text.
+
+The text is kept as a list of segments together with the tokens (or
+sentences) of each segment. An edit only re-processes the segments it
+touches, so its cost depends on the size of the edit rather than the size
+of the text.
+
+Usage:
+
+>>> doc = IncrementalTokenizer(Tokenizer('en'), text)
+>>> change = doc.edit(offset, num_deleted, inserted)
+>>> tokens[change.index:change.index + change.num_removed] = change.items
+>>> assert tokens == doc.tokens
+"""
+
+import re
+from bisect import bisect_right
+from typing import List, NamedTuple
+
+from icu_tokenizer.sent_splitter import SentSplitter
+from icu_tokenizer.tokenizer import Tokenizer
+
+__all__ = ['Change', 'IncrementalTokenizer', 'IncrementalSentSplitter']
+
+
+class Change(NamedTuple):
+    """Result of an edit.
+
+    ``items[index:index + num_removed]`` of the previous results were
+    replaced by ``items``.
+    """
+
+    index: int
+    num_removed: int
+    items: List[str]
+
+
+class _IncrementalProcessor(object):
+    """Keeps per segment results of a text up to date under edits.
+
+    Subclasses define how a piece of text is cut into segments and how a
+    segment is processed. ``MARGIN`` is the number of extra segments on
+    each side of an edit that are re-segmented with it.
+    """
+
+    MARGIN = 0
+
+    def __init__(self, text: str = ''):
+        self.set_text(text)
+
+    def _segment(self, text: str) -> List[str]:
+        raise NotImplementedError
+
+    def _process(self, segment: str) -> List[str]:
+        raise NotImplementedError
+
+    @property
+    def text(self) -> str:
+        """The current text."""
+        return ''.join(self._segments)
+
+    @property
+    def results(self) -> List[str]:
+        """Results for the current text."""
+        return [item for items in self._results for item in items]
+
+    def set_text(self, text: str):
+        """Replace the whole text and process it from scratch."""
+        self._segments = self._segment(text)
+        self._results = [self._process(s) for s in self._segments]
+        self._starts = []
+        start = 0
+        for segment in self._segments:
+            self._starts.append(start)
+            start += len(segment)
+        self._length = start
+
+    def edit(self, offset: int, num_deleted: int, inserted: str) -> Change:
+        """Apply an edit and re-process the affected segments.
+
+        Args:
+            offset (int): Character offset of the edit.
+            num_deleted (int): Number of characters deleted at offset.
+            inserted (str): Text inserted at offset.
+
+        Returns:
+            Change: The results that were replaced.
+        """
+        end = offset + num_deleted
+        if offset < 0 or num_deleted < 0 or end > self._length:
+            raise ValueError('Edit ({}, {}) out of range for length {}'
+                             .format(offset, num_deleted, self._length))
+
+        if len(self._segments) == 0:
+            self.set_text(inserted)
+            return Change(0, 0, self.results)
+
+        # Segments containing the edit, including the segment starting right
+        # where the edit ends
+        first = max(bisect_right(self._starts, offset) - 1, 0)
+        last = max(bisect_right(self._starts, end) - 1, 0)
+        first = max(first - self.MARGIN, 0)
+        last = min(last + self.MARGIN, len(self._segments) - 1)
+
+        window_start = self._starts[first]
+        window = ''.join(self._segments[first:last + 1])
+        rel_offset = offset - window_start
+        window = ''.join([
+            window[:rel_offset],
+            inserted,
+            window[rel_offset + num_deleted:]
+        ])
+
+        new_segments = self._segment(window)
+        new_results = [self._process(s) for s in new_segments]
+
+        index = sum(len(r) for r in self._results[:first])
+        num_removed = sum(len(r) for r in self._results[first:last + 1])
+
+        new_starts = []
+        start = window_start
+        for segment in new_segments:
+            new_starts.append(start)
+            start += len(segment)
+        delta = len(inserted) - num_deleted
+        self._starts[first:] = new_starts + [
+            s + delta for s in self._starts[last + 1:]]
+        self._segments[first:last + 1] = new_segments
+        self._results[first:last + 1] = new_results
+        self._length += delta
+
+        return Change(index, num_removed, [
+            item for items in new_results for item in items])
+
+
+class IncrementalTokenizer(_IncrementalProcessor):
+    """Tokenizer for a text that is edited repeatedly.
+
+    The text is cut into segments of about ``segment_size`` characters at
+    ASCII whitespace, which ICU word boundaries and the protected patterns
+    never cross. Other whitespace such as no-break spaces can be part of a
+    protected URL, so segments are never cut there. Extra protected patterns
+    that can match ASCII whitespace are not supported.
+
+    Usage:
+
+    >>> doc = IncrementalTokenizer(Tokenizer('en'), text)
+    >>> change: Change = doc.edit(offset, num_deleted, inserted)
+    >>> tokens: List[str] = doc.tokens
+    """
+
+    WHITESPACE_PATTERN = re.compile(r'[ \t\n\r\f\v]+')
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        text: str = '',
+        segment_size: int = 256,
+    ):
+        """IncrementalTokenizer.
+
+        Args:
+            tokenizer (Tokenizer): Tokenizer to apply on the segments.
+            text (str, optional): Initial text. Defaults to ''.
+            segment_size (int, optional): Minimum segment size in
+                characters. Defaults to 256.
+        """
+        self.tokenizer = tokenizer
+        self.segment_size = segment_size
+        super().__init__(text)
+
+    @property
+    def tokens(self) -> List[str]:
+        """Tokens of the current text."""
+        return self.results
+
+    def _segment(self, text: str) -> List[str]:
+        segments = []
+        p0 = 0
+        while len(text) - p0 > self.segment_size:
+            match = self.WHITESPACE_PATTERN.search(
+                text, p0 + self.segment_size)
+            if match is None or match.end() == len(text):
+                break
+            segments.append(text[p0:match.end()])
+            p0 = match.end()
+        if p0 < len(text):
+            segments.append(text[p0:])
+        return segments
+
+    def _process(self, segment: str) -> List[str]:
+        return self.tokenizer.tokenize(segment)
+
+
+class IncrementalSentSplitter(_IncrementalProcessor):
+    """Sentence splitter for a text that is edited repeatedly.
+
+    Segments are the sentences found by ICU. An edit re-splits the
+    sentences it touches plus one sentence on each side, since sentence
+    boundaries depend on the text around them.
+
+    Usage:
+
+    >>> doc = IncrementalSentSplitter(SentSplitter('en'), text)
+    >>> change: Change = doc.edit(offset, num_deleted, inserted)
+    >>> sents: List[str] = doc.sents
+    """
+
+    MARGIN = 1
+
+    def __init__(self, splitter: SentSplitter, text: str = ''):
+        """IncrementalSentSplitter.
+
+        Args:
+            splitter (SentSplitter): Splitter to find sentence boundaries.
+            text (str, optional): Initial text. Defaults to ''.
+        """
+        self.splitter = splitter
+        super().__init__(text)
+
+    @property
+    def sents(self) -> List[str]:
+        """Sentences of the current text."""
+        return self.results
+
+    def _segment(self, text: str) -> List[str]:
+        break_iterator = self.splitter.break_iterator
+        break_iterator.setText(text)
+        segments = []
+        p0 = 0
+        for p1 in break_iterator:
+            if p1 > p0:
+                segments.append(text[p0:p1])
+            p0 = p1
+        return segments
+
+    def _process(self, segment: str) -> List[str]:
+        sent = segment.strip()
+        return [sent] if len(sent) > 0 else []
@@ -6,10 +6,11 @@ from typing import Dict, List
 
 import regex
 
+from icu_tokenizer.parallel import ParallelMapMixin
 from icu_tokenizer.utils import get_all_unicode_chars
 
 
-class Normalizer(object):
+class Normalizer(ParallelMapMixin):
     """Unicode information based normalizer.
 
     Does the following
@@ -35,8 +36,12 @@ class Normalizer(object):
 
     >>> normalizer = Normalizer(lang, norm_puncts=True)
     >>> norm_text: str = normalizer.normalize(text)
+    >>> norm_texts: List[str] = normalizer.normalize_batch(texts)
+    >>> norm_texts: Iterator[str] = normalizer.map(texts, workers=4)
     """
 
+    MAP_METHOD = 'normalize'
+
     def __init__(self, lang: str = 'en', norm_puncts: bool = False):
         """Normalizer.
 
@@ -45,6 +50,8 @@ class Normalizer(object):
             norm_puncts (bool, optional): Normalize punctuations?.
                 Defaults to False.
         """
+        self._init_kwargs = {'lang': lang, 'norm_puncts': norm_puncts}
+
         # Handle control tokens
         self.ignore_pattern = regex.compile(r'\p{C}|\p{So}|\p{Z}')
 
@@ -69,6 +76,9 @@ class Normalizer(object):
             self.lang_replace_pattern = \
                 make_pattern_from_keys(lang_replace_map.keys())
 
+        # Created on first use of normalize_batch
+        self._batch_normalizer = None
+
     def _num_replace_fn(self, match: re.Match) -> str:
         return str(int(match.group(0)))
 
@@ -98,10 +108,34 @@ class Normalizer(object):
         text = ' '.join(text.split())  # Normalize whitespace
 
         if self.lang_replace_pattern is not None:
-            text = self.lang_replace_pattern(self._lang_replace_fn, text)
+            text = self.lang_replace_pattern.sub(self._lang_replace_fn, text)
 
         return text
 
+    def normalize_batch(self, texts: List[str]) -> List[str]:
+        """Perform normalization on many texts at once.
+
+        Characters of all texts are classified together with NumPy, see
+        :class:`icu_tokenizer.batch_normalizer.BatchNormalizer`. Falls back
+        to :meth:`normalize` on each text if NumPy is not installed.
+
+        Args:
+            texts (List[str]): Input texts
+
+        Returns:
+            List[str]: Normalized texts
+        """
+        if self._batch_normalizer is None:
+            try:
+                from icu_tokenizer.batch_normalizer import BatchNormalizer
+                self._batch_normalizer = BatchNormalizer(self)
+            except ImportError:
+                self._batch_normalizer = False
+
+        if self._batch_normalizer is False:
+            return [self.normalize(text) for text in texts]
+        return self._batch_normalizer.normalize_batch(texts)
+
 
 def make_pattern_from_keys(keys: List[str]) -> re.Pattern:
     """Make a re.Pattern that matches a list of strings."""
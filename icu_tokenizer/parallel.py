@@ -0,0 +1,358 @@
+"""Parallel map over lines of text.
+
+Usage:
+
+>>> tokenizer = Tokenizer('en')
+>>> for tokens in tokenizer.map(lines, workers=4):
+        ...
+
+Or with any picklable factory function
+
+>>> for result in parallel_map(make_fn, factory_args, lines, workers=4):
+        ...
+"""
+
+import multiprocessing
+import multiprocessing.util
+import threading
+import traceback
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+from icu_tokenizer.profiling import dump_profiler, start_profiler
+
+__all__ = [
+    'InFlightLimit', 'ParallelMapMixin', 'WorkerError',
+    'parallel_map', 'parallel_map_chunks'
+]
+
+BACKENDS = ('process', 'thread')
+
+# Per worker state, thread local so that thread backed workers each get
+# their own objects (ICU break iterators are not thread safe)
+_local = threading.local()
+
+
+class WorkerError(Exception):
+    """Raised when processing a line fails inside a worker.
+
+    Attributes:
+        line: The line that caused the failure, or the whole chunk for
+            functions applied on chunks.
+        worker_traceback (str): Formatted traceback from the worker.
+    """
+
+    def __init__(self, line: Any, worker_traceback: str):
+        """WorkerError."""
+        super().__init__(line, worker_traceback)
+        self.line = line
+        self.worker_traceback = worker_traceback
+
+    def __str__(self):  # noqa
+        return 'Failed to process line {!r}\n\n{}'.format(
+            self.line, self.worker_traceback)
+
+
+class InFlightLimit(object):
+    """Bounds the number of chunks read ahead of the consumer.
+
+    :func:`parallel_map_chunks` calls :meth:`acquire` before reading each
+    chunk from its input and :meth:`release` for each chunk of results it
+    yields. Once :meth:`close` is called, :meth:`acquire` stops blocking and
+    returns False, which ends the input.
+    """
+
+    def __init__(self, limit: int):
+        """InFlightLimit.
+
+        Args:
+            limit (int): Maximum number of chunks in flight.
+        """
+        self.limit = max(limit, 1)
+        self.closed = False
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        """Wait until another chunk may be read.
+
+        Returns:
+            bool: False if closed, no more chunks should be read.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit and not self.closed:
+                self._condition.wait()
+            if self.closed:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        """Report a chunk of results handed to the consumer."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Stop reading chunks and wake up a waiting reader."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+def _iter_limited(
+    chunks: Iterable[Sequence],
+    in_flight: InFlightLimit,
+) -> Iterator[Sequence]:
+    chunks = iter(chunks)
+    while in_flight.acquire():
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        yield chunk
+
+
+def _apply(fn: Callable, chunk: Sequence, batched: bool = False) -> List:
+    if batched:
+        try:
+            return list(fn(chunk))
+        except Exception:
+            raise WorkerError(chunk, traceback.format_exc()) from None
+
+    results = []
+    for line in chunk:
+        try:
+            results.append(fn(line))
+        except Exception:
+            raise WorkerError(line, traceback.format_exc()) from None
+    return results
+
+
+def _worker_init_fn(
+    fn_factory: Callable,
+    factory_args: Sequence,
+    profile_dir: Optional[str] = None,
+    profilers: Optional[list] = None,
+    batched: bool = False,
+):
+    if profile_dir is not None:
+        profiler = start_profiler()
+        if profilers is not None:
+            # Thread backed worker, dumped once the pool is joined
+            profilers.append(profiler)
+        else:
+            multiprocessing.util.Finalize(
+                None, dump_profiler,
+                args=(profiler, profile_dir), exitpriority=10)
+    _local.fn = fn_factory(*factory_args)
+    _local.batched = batched
+
+
+def _worker_fn(chunk: Sequence) -> List:
+    return _apply(_local.fn, chunk, _local.batched)
+
+
+def _iter_chunks(iterable: Iterable, chunk_size: int) -> Iterator[List]:
+    chunk = []
+    for line in iterable:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def parallel_map_chunks(
+    fn_factory: Callable[..., Callable],
+    factory_args: Sequence,
+    chunks: Iterable[Sequence],
+    workers: int = 0,
+    ordered: bool = True,
+    backend: str = 'process',
+    profile_dir: Optional[str] = None,
+    batched: bool = False,
+    in_flight: Optional[InFlightLimit] = None,
+) -> Iterator[List]:
+    """Apply a function on chunks of lines with a pool of workers.
+
+    Each worker calls ``fn_factory(*factory_args)`` once at start-up and
+    uses the returned function for every line it receives. With
+    ``batched``, the function is instead called once per chunk and returns
+    the results of all its lines.
+
+    Chunks are read from the input only as results are consumed, at most
+    ``in_flight.limit`` chunks ahead.
+
+    With ``profile_dir``, every worker is profiled with cProfile and writes
+    its profile to ``profile_dir`` when the pool shuts down, see
+    :mod:`icu_tokenizer.profiling`.
+
+    Args:
+        fn_factory (Callable[..., Callable]): Picklable function that
+            creates the function to apply on each line.
+        factory_args (Sequence): Arguments for ``fn_factory``.
+        chunks (Iterable[Sequence]): Chunks of lines. Consumed lazily.
+        workers (int, optional): Number of workers. 0 to process in the
+            calling thread, negative to use all cores. Defaults to 0.
+        ordered (bool, optional): Return chunks in input order.
+            Defaults to True.
+        backend (str, optional): Either ``'process'`` or ``'thread'``.
+            Defaults to ``'process'``.
+        profile_dir (Optional[str], optional): Directory to write worker
+            profiles to. Defaults to None (no profiling).
+        batched (bool, optional): Apply the function on whole chunks.
+            Defaults to False.
+        in_flight (Optional[InFlightLimit], optional): Limit on the number
+            of chunks read ahead. Defaults to twice the number of workers.
+
+    Raises:
+        WorkerError: If processing a line fails.
+
+    Yields:
+        List: Results for each chunk.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('backend must be one of {}, got {}'.format(
+            BACKENDS, backend))
+
+    if workers == 0:
+        profiler = None
+        if profile_dir is not None:
+            profiler = start_profiler()
+        fn = fn_factory(*factory_args)
+        for chunk in chunks:
+            yield _apply(fn, chunk, batched)
+        if profiler is not None:
+            dump_profiler(profiler, profile_dir)
+        return
+
+    if backend == 'thread':
+        import multiprocessing.dummy as pool_module
+    else:
+        pool_module = multiprocessing
+
+    if workers < 0:  # Use all cores
+        workers = multiprocessing.cpu_count()
+
+    if in_flight is None:
+        in_flight = InFlightLimit(2 * workers)
+    chunks = _iter_limited(chunks, in_flight)
+
+    profilers = [] if backend == 'thread' else None
+    with pool_module.Pool(
+        workers,
+        initializer=_worker_init_fn,
+        initargs=[
+            fn_factory, factory_args, profile_dir, profilers, batched]
+    ) as pool:
+        if ordered:
+            results = pool.imap(_worker_fn, chunks)
+        else:
+            results = pool.imap_unordered(_worker_fn, chunks)
+        try:
+            for chunk_results in results:
+                in_flight.release()
+                yield chunk_results
+        finally:
+            # The pool can only shut down once its input stops blocking
+            in_flight.close()
+
+        # Let workers exit normally so that their finalizers run
+        pool.close()
+        pool.join()
+
+    for i, profiler in enumerate(profilers or []):
+        dump_profiler(profiler, profile_dir, thread_id=i)
+
+
+def parallel_map(
+    fn_factory: Callable[..., Callable],
+    factory_args: Sequence,
+    iterable: Iterable,
+    workers: int = 0,
+    chunk_size: int = 256,
+    ordered: bool = True,
+    backend: str = 'process',
+    profile_dir: Optional[str] = None,
+) -> Iterator:
+    """Apply a function on lines with a pool of workers.
+
+    Same as :func:`parallel_map_chunks` but takes and yields individual
+    lines, which are sent to the workers in chunks of ``chunk_size``.
+    With ``ordered=False`` lines are yielded in the order chunks complete.
+    """
+    chunks = _iter_chunks(iterable, chunk_size)
+    for chunk_results in parallel_map_chunks(
+        fn_factory, factory_args, chunks,
+        workers=workers, ordered=ordered, backend=backend,
+        profile_dir=profile_dir
+    ):
+        yield from chunk_results
+
+
+def _make_bound_method(cls: type, kwargs: dict, method_name: str):
+    return getattr(cls(**kwargs), method_name)
+
+
+def _identity(fn: Callable) -> Callable:
+    return fn
+
+
+class ParallelMapMixin(object):
+    """Adds a parallel ``map`` method to the processing classes.
+
+    Subclasses set ``MAP_METHOD`` to the name of the method to apply and
+    store their constructor keyword arguments in ``self._init_kwargs`` so
+    that workers can create their own instance.
+    """
+
+    MAP_METHOD: str = None
+
+    def map(
+        self,
+        iterable: Iterable[str],
+        workers: int = 0,
+        chunk_size: int = 256,
+        ordered: bool = True,
+        backend: str = 'process',
+        profile_dir: Optional[str] = None,
+    ) -> Iterator:
+        """Lazily apply this object on many lines in parallel.
+
+        Args:
+            iterable (Iterable[str]): Input lines.
+            workers (int, optional): Number of workers. 0 to process in the
+                calling thread, negative to use all cores. Defaults to 0.
+            chunk_size (int, optional): Number of lines sent to a worker at
+                once. Defaults to 256.
+            ordered (bool, optional): Keep input order. Defaults to True.
+            backend (str, optional): Either ``'process'`` or ``'thread'``.
+                Defaults to ``'process'``.
+            profile_dir (Optional[str], optional): Directory to write worker
+                profiles to. Defaults to None (no profiling).
+
+        Raises:
+            WorkerError: If processing a line fails.
+
+        Returns:
+            Iterator: Results, one per input line.
+        """
+        if workers == 0:
+            # No need to create another instance in the calling thread
+            fn_factory = _identity
+            factory_args = [getattr(self, self.MAP_METHOD)]
+        else:
+            fn_factory = _make_bound_method
+            factory_args = [type(self), self._init_kwargs, self.MAP_METHOD]
+
+        return parallel_map(
+            fn_factory,
+            factory_args,
+            iterable,
+            workers=workers,
+            chunk_size=chunk_size,
+            ordered=ordered,
+            backend=backend,
+            profile_dir=profile_dir
+        )
@@ -0,0 +1,152 @@
+"""Profiling of pool workers.
+
+Every worker runs its own ``cProfile`` profiler and writes it to
+``<profile_dir>/worker-<pid>-<thread>.prof`` when it shuts down.
+:func:`merge_profiles` then combines these into a single pstats file and a
+collapsed stack file, which can be turned into a flamegraph with
+``flamegraph.pl`` or loaded into speedscope.
+
+Usage:
+
+>>> list(tokenizer.map(lines, workers=4, profile_dir='prof'))
+>>> pstats_path, collapsed_path = merge_profiles('prof')
+"""
+
+import cProfile
+import glob
+import os
+import pstats
+import threading
+from typing import Dict, List, Optional, TextIO, Tuple
+
+__all__ = ['merge_profiles', 'write_collapsed_stacks']
+
+MERGED_PSTATS_NAME = 'merged.prof'
+MERGED_COLLAPSED_NAME = 'merged.collapsed'
+
+
+def start_profiler() -> cProfile.Profile:
+    """Start profiling the current thread."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_profiler(
+    profiler: cProfile.Profile,
+    profile_dir: str,
+    thread_id: Optional[int] = None,
+):
+    """Stop a profiler and write it to the profile directory.
+
+    ``thread_id`` defaults to the identifier of the current thread.
+    """
+    profiler.disable()
+    if thread_id is None:
+        thread_id = threading.get_ident()
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, 'worker-{}-{}.prof'.format(
+        os.getpid(), thread_id))
+    profiler.dump_stats(path)
+
+
+def get_worker_profiles(profile_dir: str) -> List[str]:
+    """List the worker profiles in a directory."""
+    return sorted(glob.glob(os.path.join(profile_dir, 'worker-*.prof')))
+
+
+def clear_profiles(profile_dir: str):
+    """Remove worker profiles left in a directory by a previous run."""
+    for path in get_worker_profiles(profile_dir):
+        os.remove(path)
+
+
+def _format_frame(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == '~':  # Builtins
+        frame = name
+    else:
+        frame = '{}:{}:{}'.format(os.path.basename(filename), line, name)
+    return frame.replace(';', ':')
+
+
+def write_collapsed_stacks(
+    stats: pstats.Stats,
+    f: TextIO,
+    max_depth: int = 64,
+):
+    """Write stats as collapsed stacks, one ``frame;frame;... value`` per line.
+
+    cProfile only records caller/callee pairs, so full stacks are
+    reconstructed by splitting the time of each function among its callers
+    in proportion to the time spent through each of them. Values are in
+    microseconds.
+
+    Args:
+        stats (pstats.Stats): Profile statistics.
+        f (TextIO): File to write to.
+        max_depth (int, optional): Maximum stack depth. Defaults to 64.
+    """
+    entries = stats.stats
+    callees: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, ct) in callers.items():
+            callees.setdefault(caller, {})[func] = ct
+
+    stacks: Dict[str, float] = {}
+
+    # Paths taking less than this are dropped to keep the traversal small
+    total_time = sum(
+        ct for _, _, _, ct, callers in entries.values() if len(callers) == 0)
+    min_time = total_time * 1e-4
+
+    def visit(func, stack, on_stack, budget):
+        _, _, tt, ct, _ = entries[func]
+        if ct <= 0 or budget <= 0 or budget < min_time:
+            return
+        ratio = min(budget / ct, 1.)
+        frames = stack + [_format_frame(func)]
+        key = ';'.join(frames)
+        stacks[key] = stacks.get(key, 0.) + tt * ratio
+
+        if len(frames) >= max_depth:
+            return
+        on_stack.add(func)
+        for callee, edge_time in callees.get(func, {}).items():
+            if callee not in on_stack and callee in entries:
+                visit(callee, frames, on_stack, edge_time * ratio)
+        on_stack.remove(func)
+
+    for func, (_, _, _, ct, callers) in entries.items():
+        if len(callers) == 0:
+            visit(func, [], set(), ct)
+
+    for key, value in sorted(stacks.items()):
+        microseconds = int(round(value * 1e6))
+        if microseconds > 0:
+            f.write('{} {}\n'.format(key, microseconds))
+
+
+def merge_profiles(profile_dir: str) -> Tuple[str, str]:
+    """Merge the worker profiles in a directory.
+
+    Args:
+        profile_dir (str): Directory containing worker profiles.
+
+    Returns:
+        Tuple[str, str]: Paths of the merged pstats file and of the
+        collapsed stack file.
+    """
+    paths = get_worker_profiles(profile_dir)
+    if len(paths) == 0:
+        raise ValueError('No worker profiles found in {}'.format(profile_dir))
+
+    stats = pstats.Stats(*paths)
+    pstats_path = os.path.join(profile_dir, MERGED_PSTATS_NAME)
+    stats.dump_stats(pstats_path)
+
+    collapsed_path = os.path.join(profile_dir, MERGED_COLLAPSED_NAME)
+    with open(collapsed_path, 'w', encoding='utf-8') as f:
+        write_collapsed_stacks(stats, f)
+
+    return pstats_path, collapsed_path
@@ -2,20 +2,25 @@ from typing import List
 
 from icu import BreakIterator, Locale
 
+from icu_tokenizer.parallel import ParallelMapMixin
 from icu_tokenizer.utils import apply_break_iterator
 
 
-class SentSplitter(object):
+class SentSplitter(ParallelMapMixin):
     """ICU sentence splitter.
 
     Usage:
 
     >>> splitter = SentSplitter(lang)
     >>> sents: List[str] = splitter.split(paragraph)
+    >>> sents_list: Iterator[List[str]] = splitter.map(paragraphs, workers=4)
     """
 
+    MAP_METHOD = 'split'
+
     def __init__(self, lang: str = 'en'):
         """SentSplitter."""
+        self._init_kwargs = {'lang': lang}
         self.lang = lang
         self.locale = Locale(lang)
         self.break_iterator = \
@@ -0,0 +1,553 @@
+"""Asyncio server that batches requests onto warm worker processes.
+
+Requests and responses are JSON objects, one per line, sent over a unix
+socket or a localhost TCP connection.
+
+Request
+
+>>> {"id": 1, "op": "tokenize", "text": "Hello world", "lang": "en"}
+
+Response
+
+>>> {"id": 1, "result": ["Hello", "world"]}
+
+``op`` is one of ``normalize``, ``tokenize``, ``split`` or ``stats``.
+``lang`` is optional and defaults to the language of the server, the
+other accepted languages can be limited with an allow-list. Failed requests
+get a response with an ``error`` message instead of a ``result``. Responses
+may arrive out of order, use ``id`` to match them to requests.
+
+Usage:
+
+>>> client = await Client.connect(unix_path='/tmp/icu_tokenizer.sock')
+>>> tokens: List[str] = await client.tokenize('Hello world')
+>>> await client.close()
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from icu_tokenizer.normalizer import Normalizer
+from icu_tokenizer.sent_splitter import SentSplitter
+from icu_tokenizer.tokenizer import Tokenizer
+
+__all__ = ['Server', 'Client', 'ServerError']
+
+DEFAULT_PORT = 8765
+
+# Maximum size in bytes of a request or response line
+LINE_LIMIT = 1 << 26
+
+OPS = ('normalize', 'tokenize', 'split')
+
+# Maximum number of (op, lang) processors a worker keeps loaded
+MAX_PROCESSORS = 64
+
+# Per worker process state, processors are kept in least recently used order
+_CONFIG = {}
+_PROCESSORS: 'OrderedDict[Tuple[str, str], Callable[[str], Any]]' = \
+    OrderedDict()
+
+
+class ServerError(Exception):
+    """Error message returned by the server for a request."""
+
+
+def _get_processor(op: str, lang: str) -> Callable[[str], Any]:
+    key = (op, lang)
+    if key in _PROCESSORS:
+        _PROCESSORS.move_to_end(key)
+        return _PROCESSORS[key]
+
+    if op == 'normalize':
+        processor = Normalizer(
+            lang, norm_puncts=_CONFIG['norm_puncts']).normalize
+    elif op == 'tokenize':
+        processor = Tokenizer(
+            lang,
+            annotate_hyphens=_CONFIG['annotate_hyphens'],
+            protect_emails_urls=_CONFIG['protect_emails_urls']
+        ).tokenize
+    elif op == 'split':
+        processor = SentSplitter(lang).split
+    else:
+        raise ValueError('Unknown op {}'.format(op))
+
+    _PROCESSORS[key] = processor
+    while len(_PROCESSORS) > MAX_PROCESSORS:
+        _PROCESSORS.popitem(last=False)
+    return processor
+
+
+def _worker_init_fn(config: dict):
+    _CONFIG.update(config)
+    for op in OPS:
+        _get_processor(op, config['lang'])
+
+
+def _process_batch(
+    op: str,
+    lang: str,
+    texts: List[str],
+) -> List[Tuple[bool, Any]]:
+    processor = _get_processor(op, lang)
+    results = []
+    for text in texts:
+        try:
+            results.append((True, processor(text)))
+        except Exception as e:
+            results.append((False, '{}: {}'.format(type(e).__name__, e)))
+    return results
+
+
+async def _discard_line(reader: asyncio.StreamReader, num_bytes: int):
+    """Skip the rest of a line longer than the limit of a reader.
+
+    ``num_bytes`` is the number of bytes of the line known to precede the
+    newline, from :class:`asyncio.LimitOverrunError`.
+    """
+    try:
+        while True:
+            await reader.readexactly(num_bytes)
+            try:
+                await reader.readuntil(b'\n')
+                return
+            except asyncio.LimitOverrunError as e:
+                num_bytes = e.consumed
+    except asyncio.IncompleteReadError:
+        pass
+
+
+def _write_response(writer: asyncio.StreamWriter, response: dict):
+    writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    writer.write(b'\n')
+
+
+class _Request(object):
+    __slots__ = ['op', 'lang', 'text', 'future']
+
+    def __init__(self, op: str, lang: str, text: str, future: asyncio.Future):
+        self.op = op
+        self.lang = lang
+        self.text = text
+        self.future = future
+
+
+class Server(object):
+    """Serve normalize, tokenize and split requests.
+
+    Concurrent requests are coalesced into micro-batches, which are
+    processed by a pool of worker processes that keep their ICU objects
+    loaded between requests. A batch is sent once it holds
+    ``max_batch_size`` requests or its first request has waited
+    ``max_wait`` seconds.
+
+    Workers keep the processors of at most :data:`MAX_PROCESSORS`
+    operations and languages, the least recently used are dropped.
+
+    Usage:
+
+    >>> server = Server(lang='en', num_workers=4)
+    >>> await server.start(unix_path='/tmp/icu_tokenizer.sock')
+    >>> await server.serve_forever()
+    """
+
+    def __init__(
+        self,
+        lang: str = 'en',
+        langs: Optional[Sequence[str]] = None,
+        norm_puncts: bool = False,
+        annotate_hyphens: bool = False,
+        protect_emails_urls: bool = False,
+        num_workers: int = 1,
+        max_batch_size: int = 64,
+        max_wait: float = 0.002,
+        line_limit: int = LINE_LIMIT,
+    ):
+        """Server.
+
+        Args:
+            lang (str, optional): Default language identifier.
+                Defaults to 'en'.
+            langs (Optional[Sequence[str]], optional): Other languages
+                accepted in requests, requests for any other language get
+                an error. None to accept every language. Defaults to None.
+            norm_puncts (bool, optional): Normalize punctuations.
+                Defaults to False.
+            annotate_hyphens (bool, optional): Annotate hyphens when
+                tokenizing. Defaults to False.
+            protect_emails_urls (bool, optional): Protect emails and urls
+                when tokenizing. Defaults to False.
+            num_workers (int, optional): Number of worker processes.
+                Defaults to 1.
+            max_batch_size (int, optional): Maximum number of requests in
+                a batch. Defaults to 64.
+            max_wait (float, optional): Maximum number of seconds a request
+                waits for a batch to fill up. Defaults to 0.002.
+            line_limit (int, optional): Maximum size of a request in bytes.
+                Defaults to 64 MiB.
+        """
+        self.lang = lang
+        self.langs = None
+        if langs is not None:
+            self.langs = {lang, *langs}
+        self.num_workers = num_workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.line_limit = line_limit
+        self._config = {
+            'lang': lang,
+            'norm_puncts': norm_puncts,
+            'annotate_hyphens': annotate_hyphens,
+            'protect_emails_urls': protect_emails_urls,
+        }
+
+        self._executor = None
+        self._server = None
+        self._queue = None
+        self._batch_task = None
+        self._slots = None
+
+        self._latencies = deque(maxlen=10000)
+        self._num_requests = 0
+        self._num_batches = 0
+        self._num_in_flight = 0
+
+    async def start(
+        self,
+        unix_path: Optional[str] = None,
+        host: str = '127.0.0.1',
+        port: int = DEFAULT_PORT,
+    ):
+        """Start the worker processes and listen for connections.
+
+        Args:
+            unix_path (Optional[str], optional): Listen on a unix socket at
+                this path instead of TCP. Defaults to None.
+            host (str, optional): TCP host. Defaults to '127.0.0.1'.
+            port (int, optional): TCP port. Defaults to 8765.
+        """
+        loop = asyncio.get_event_loop()
+        self._executor = ProcessPoolExecutor(
+            self.num_workers,
+            initializer=_worker_init_fn,
+            initargs=[self._config]
+        )
+        # Start every worker now rather than on the first requests
+        await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _process_batch,
+                                 'normalize', self.lang, [])
+            for _ in range(self.num_workers)
+        ])
+
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.num_workers * 2)
+        self._batch_task = asyncio.ensure_future(self._batch_loop())
+
+        if unix_path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path=unix_path,
+                limit=self.line_limit)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host=host, port=port,
+                limit=self.line_limit)
+
+    async def serve_forever(self):
+        """Serve until cancelled."""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stop listening and shut down the worker processes."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def get_stats(self) -> dict:
+        """Get latency percentiles (in ms), queue depth and batch counts."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if len(latencies) == 0:
+                return None
+            i = min(int(len(latencies) * p / 100), len(latencies) - 1)
+            return latencies[i] * 1000
+
+        return {
+            'p50_ms': percentile(50),
+            'p99_ms': percentile(99),
+            'queue_depth': 0 if self._queue is None else self._queue.qsize(),
+            'in_flight': self._num_in_flight,
+            'num_requests': self._num_requests,
+            'num_batches': self._num_batches,
+        }
+
+    async def submit(self, op: str, text: str, lang: Optional[str] = None):
+        """Process a single text through the batching queue.
+
+        Raises:
+            ServerError: If processing the text fails.
+        """
+        if op not in OPS:
+            raise ServerError('Unknown op {}'.format(op))
+        if not isinstance(text, str):
+            raise ServerError('text must be a string')
+        if lang is not None and not isinstance(lang, str):
+            raise ServerError('lang must be a string')
+        if not lang:
+            lang = self.lang
+        elif self.langs is not None and lang not in self.langs:
+            raise ServerError('Unsupported lang {}'.format(lang))
+
+        start_time = time.perf_counter()
+        future = asyncio.get_event_loop().create_future()
+        self._num_in_flight += 1
+        try:
+            await self._queue.put(
+                _Request(op, lang, text, future))
+            ok, result = await future
+        finally:
+            self._num_in_flight -= 1
+        self._num_requests += 1
+        self._latencies.append(time.perf_counter() - start_time)
+
+        if not ok:
+            raise ServerError(result)
+        return result
+
+    async def _batch_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while True:
+                while len(batch) < self.max_batch_size:
+                    if self._queue.empty():
+                        break
+                    batch.append(self._queue.get_nowait())
+                remaining = deadline - loop.time()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+
+            # A bad batch must not stop the loop, every later request
+            # would wait forever
+            try:
+                await self._dispatch_batch(batch)
+            except Exception as e:
+                error = '{}: {}'.format(type(e).__name__, e)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_result((False, error))
+
+    async def _dispatch_batch(self, batch: List[_Request]):
+        groups: Dict[Tuple[str, str], List[_Request]] = {}
+        for request in batch:
+            key = (request.op, request.lang)
+            groups.setdefault(key, []).append(request)
+        for (op, lang), requests in groups.items():
+            await self._slots.acquire()
+            asyncio.ensure_future(self._run_batch(op, lang, requests))
+
+    async def _run_batch(self, op: str, lang: str, requests: List[_Request]):
+        loop = asyncio.get_event_loop()
+        self._num_batches += 1
+        try:
+            results = await loop.run_in_executor(
+                self._executor, _process_batch,
+                op, lang, [r.text for r in requests])
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+            results = [(False, error)] * len(requests)
+        finally:
+            self._slots.release()
+
+        for request, result in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if request.get('op') == 'stats':
+                response = {'id': request_id, 'result': self.get_stats()}
+            else:
+                result = await self.submit(
+                    request.get('op'),
+                    request.get('text'),
+                    request.get('lang')
+                )
+                response = {'id': request_id, 'result': result}
+        except (ServerError, ValueError, AttributeError) as e:
+            response = {'id': request_id, 'error': str(e)}
+
+        _write_response(writer, response)
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        tasks = []
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial  # Last line without a newline
+                except asyncio.LimitOverrunError as e:
+                    await _discard_line(reader, e.consumed)
+                    _write_response(writer, {
+                        'id': None,
+                        'error': 'Request exceeds the limit of {} bytes'
+                        .format(self.line_limit)
+                    })
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                tasks.append(asyncio.ensure_future(
+                    self._handle_request(line, writer)))
+                tasks = [t for t in tasks if not t.done()]
+                await writer.drain()
+            await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class Client(object):
+    """Async client for :class:`Server`.
+
+    A single connection supports many concurrent requests.
+
+    Usage:
+
+    >>> client = await Client.connect(host='127.0.0.1', port=8765)
+    >>> norm_text, tokens = await asyncio.gather(
+            client.normalize(text), client.tokenize(text))
+    >>> await client.close()
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        """Client, use :meth:`Client.connect` to create one."""
+        self._reader = reader
+        self._writer = writer
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def connect(
+        cls,
+        unix_path: Optional[str] = None,
+        host: str = '127.0.0.1',
+        port: int = DEFAULT_PORT,
+        line_limit: int = LINE_LIMIT,
+    ) -> 'Client':
+        """Connect to a server over a unix socket or TCP.
+
+        ``line_limit`` is the maximum size of a response in bytes.
+        """
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(
+                unix_path, limit=line_limit)
+        else:
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=line_limit)
+        return cls(reader, writer)
+
+    async def request(
+        self,
+        op: str,
+        text: Optional[str] = None,
+        lang: Optional[str] = None,
+    ) -> Any:
+        """Send a request and wait for its result.
+
+        Raises:
+            ServerError: If the server failed to process the request.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        request = {'id': request_id, 'op': op}
+        if text is not None:
+            request['text'] = text
+        if lang is not None:
+            request['lang'] = lang
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(
+            json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        await self._writer.drain()
+        return await future
+
+    async def normalize(self, text: str, lang: Optional[str] = None) -> str:
+        """Normalize text."""
+        return await self.request('normalize', text, lang)
+
+    async def tokenize(
+        self,
+        text: str,
+        lang: Optional[str] = None,
+    ) -> List[str]:
+        """Tokenize text."""
+        return await self.request('tokenize', text, lang)
+
+    async def split(self, text: str, lang: Optional[str] = None) -> List[str]:
+        """Split text into sentences."""
+        return await self.request('split', text, lang)
+
+    async def stats(self) -> dict:
+        """Get the latency and queue statistics of the server."""
+        return await self.request('stats')
+
+    async def close(self):
+        """Close the connection."""
+        self._writer.close()
+        await self._read_task
+
+    async def _read_loop(self):
+        error = 'Connection to server closed'
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response['id'], None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(ServerError(response['error']))
+                else:
+                    future.set_result(response['result'])
+        except ConnectionError:
+            pass
+        except ValueError:
+            # Responses can no longer be matched to their requests
+            error = 'Response exceeds the line limit'
+            self._writer.close()
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(error))
+            self._pending.clear()
@@ -1,15 +1,17 @@
 import re
-from typing import List, Union
+from typing import List, Optional, Union
 
 from icu import BreakIterator, Locale
 
+from icu_tokenizer.break_rules import compile_break_rules
+from icu_tokenizer.parallel import ParallelMapMixin
 from icu_tokenizer.url_utils import email_pattern, grubber_url_matcher
 from icu_tokenizer.utils import apply_break_iterator
 
 PROTECTED_TEMPLATE = '__PROTECTED_SEQUENCE_{}__'
 
 
-class Tokenizer(object):
+class Tokenizer(ParallelMapMixin):
     """ICU based tokenizer with additional functionality to protect sequences.
 
     Usage:
@@ -19,10 +21,15 @@ class Tokenizer(object):
             annotate_hyphens: bool,
             protect_emails_urls: bool,
             extra_protected_patterns: List[Union[str, re.Pattern]] = [],
+            break_rules: Optional[str] = None,
+            cache_break_rules: bool = False,
         )
     >>> tokens: List[str] = tokenizer.tokenize(text)
+    >>> tokens_list: Iterator[List[str]] = tokenizer.map(texts, workers=4)
     """
 
+    MAP_METHOD = 'tokenize'
+
     HYPHEN_PATTERN = re.compile(r'(\w)\-(?=\w)')
     HYPHEN_PATTERN_REPL = r'\1 @-@ '
     PROTECTED_HYPHEN_PATTERN = re.compile(r'@\-@')
@@ -33,6 +40,8 @@ class Tokenizer(object):
         annotate_hyphens: bool = False,
         protect_emails_urls: bool = False,
         extra_protected_patterns: List[Union[str, re.Pattern]] = [],
+        break_rules: Optional[str] = None,
+        cache_break_rules: bool = False,
     ):
         """Tokenizer.
 
@@ -42,11 +51,29 @@ class Tokenizer(object):
             protect_emails_urls {bool} -- Protect urls (default: {False})
             extra_protected_patterns {List[Union[str, re.Pattern]]} --
                 A list of regex patterns (default: {[]})
+            break_rules {Optional[str]} -- Custom ICU word break rules used
+                instead of the rules for lang (default: {None})
+            cache_break_rules {bool} -- Load compiled break_rules from the
+                on disk cache, see icu_tokenizer.break_rules
+                (default: {False})
         """
+        self._init_kwargs = {
+            'lang': lang,
+            'annotate_hyphens': annotate_hyphens,
+            'protect_emails_urls': protect_emails_urls,
+            'extra_protected_patterns': list(extra_protected_patterns),
+            'break_rules': break_rules,
+            'cache_break_rules': cache_break_rules,
+        }
+
         self.lang = lang
         self.locale = Locale(lang)
-        self.break_iterator = \
-            BreakIterator.createWordInstance(self.locale)
+        if break_rules is None:
+            self.break_iterator = \
+                BreakIterator.createWordInstance(self.locale)
+        else:
+            self.break_iterator = compile_break_rules(
+                break_rules, use_cache=cache_break_rules)
         self.protected_patterns = []
 
         self.annotate_hyphens = annotate_hyphens
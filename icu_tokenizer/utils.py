@@ -52,6 +52,18 @@ def get_versions() -> dict:
     except ImportError:
         pass
 
+    try:
+        import numpy
+        versions['numpy'] = numpy.__version__
+    except ImportError:
+        pass
+
+    try:
+        import pyarrow
+        versions['pyarrow'] = pyarrow.__version__
+    except ImportError:
+        pass
+
     return versions
 
 
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from icu_tokenizer import Tokenizer
+from icu_tokenizer.incremental import IncrementalTokenizer
+
+PIECES = [
+    'see', 'http://x.com/a', 'b', 'mail@example.com', 'hello', 'world',
+    "don't", '3.14', '-', ',', '.', '?', '漢字', 'ข้อความ',
+    ' ', ' ', '  ', '\t', '\n', '\r\n', '\xa0', ' ', '　',
+    '\u0085', ' ', '\x1c',
+]
+
+
+def random_text(rng: random.Random, num_pieces: int) -> str:  # noqa
+    return ''.join(rng.choice(PIECES) for _ in range(num_pieces))
+
+
+@pytest.mark.parametrize('protect_emails_urls', [False, True])
+@pytest.mark.parametrize('segment_size', [1, 4, 16])
+def test_random_edits(protect_emails_urls, segment_size):  # noqa
+    rng = random.Random(segment_size)
+    tokenizer = Tokenizer('en', protect_emails_urls=protect_emails_urls)
+
+    text = random_text(rng, 50)
+    doc = IncrementalTokenizer(tokenizer, text, segment_size=segment_size)
+    tokens = doc.tokens
+    assert tokens == tokenizer.tokenize(text)
+
+    for _ in range(200):
+        offset = rng.randint(0, len(text))
+        num_deleted = rng.randint(0, min(len(text) - offset, 10))
+        inserted = random_text(rng, rng.randint(0, 4))
+
+        change = doc.edit(offset, num_deleted, inserted)
+        text = text[:offset] + inserted + text[offset + num_deleted:]
+        tokens[change.index:change.index + change.num_removed] = change.items
+
+        assert doc.text == text
+        assert doc.tokens == tokenizer.tokenize(text)
+        assert tokens == doc.tokens